@@ -0,0 +1,75 @@
+"""
+Dump a homogeneous list of flat records with a large rule table.
+
+    python benchmarks/bench_records.py --rows 1000000 --rules 2000
+    python benchmarks/bench_records.py --rows 100000 --memory  # peak memory by phase and structure
+    python benchmarks/bench_records.py --rows 100000 --rules 0  # no rules at all
+    python benchmarks/bench_records.py --rows 100000 --plain  # yaml.Dumper, for comparison
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.curdir))
+
+import yaml
+
+import yaml_comments
+
+
+COLUMNS = ("id", "name", "host", "cpu", "memory")
+
+
+def make_rows(count: int):
+    return {
+        "rows": [
+            {"id": i, "name": f"item-{i}", "host": f"h{i % 97}", "cpu": i % 8, "memory": 0.5 * i}
+            for i in range(count)
+        ]
+    }
+
+
+def make_rules(count: int):
+    if count == 0:
+        return dict()
+    before, after, style = dict(), dict(), dict()
+    for i in range(count):
+        before[f"^rows/{i * 7}$"] = f"# row {i * 7}"
+        after[f"^rows/{i * 11}/memory$"] = f"# memory of row {i * 11}"
+    style["^rows/\\d+/name$"] = yaml_comments.DOUBLE_QUOTE
+    style["^rows/[0-9]*5/host$"] = yaml_comments.SINGLE_QUOTE
+    flow_style = {"^rows/\\d+$": yaml_comments.EXPAND}
+    return dict(before=before, after=after, style=style, flow_style=flow_style)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--rules", type=int, default=2000)
+    parser.add_argument("--memory", action="store_true", help="print a memory report instead of timings")
+    parser.add_argument("--plain", action="store_true", help="dump with yaml.Dumper, without rules")
+    args = parser.parse_args()
+
+    data = make_rows(args.rows)
+    dumper = yaml.Dumper if args.plain else yaml_comments.create_dumper(**make_rules(args.rules))
+
+    if args.memory:
+        _, report = yaml_comments.dump_with_report(data, Dumper=dumper)
+        print(f"rows={args.rows} rules={args.rules} output={report.output / 1e6:.1f} MB")
+        print(report.format())
+        return
+
+    start = time.perf_counter()
+    buffer = io.StringIO()
+    yaml.dump(data, buffer, dumper)
+    elapsed = time.perf_counter() - start
+
+    size = len(buffer.getvalue())
+    print(f"rows={args.rows} rules={'yaml.Dumper' if args.plain else args.rules} cells={args.rows * len(COLUMNS)}")
+    print(f"time={elapsed:.2f}s rows/s={args.rows / elapsed:,.0f} MB/s={size / elapsed / 1e6:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Import time and first dump latency of a fresh interpreter, relative to
+PyYAML's own in the same run, compared with the ratios saved in
+startup_baseline.json. Exits with 1 on a regression.
+
+Milliseconds depend on the machine and its load, ratios much less: each
+run measures "import yaml" and a first yaml.dump with the plain Dumper
+next to yaml_comments and keeps the fastest of the runs for both.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --update  # save new baseline
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_baseline.json")
+
+# prints the time of "import yaml" and of the first dump, with yaml_comments
+# both after yaml is imported: the import of PyYAML is not ours to change
+SCRIPT = """
+import time
+start = time.perf_counter()
+import io, yaml
+imported = time.perf_counter()
+if {comments}:
+    import yaml_comments
+    own = time.perf_counter()
+    dumper = yaml_comments.create_dumper(
+        before={{"^a$": "# a", "^b/\\\\d+$": "# item"}}, after={{"c$": "# c"}}, style={{"^c/x$": "|"}}
+    )
+else:
+    own = imported
+    dumper = yaml.Dumper
+yaml.dump({{"a": 1, "b": [1, 2], "c": {{"x": "y"}}}}, io.StringIO(), dumper)
+print(imported - start, own - imported, time.perf_counter() - own)
+"""
+
+
+def _run(comments: bool, env: dict) -> list:
+    args = [sys.executable, "-c", SCRIPT.format(comments=comments)]
+    out = subprocess.run(args, env=env, capture_output=True, text=True, check=True).stdout
+    return [float(x) * 1000 for x in out.split()]
+
+
+def measure(runs: int) -> dict:
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(os.curdir))
+    env.pop("PYTHONDONTWRITEBYTECODE", None)  # timings are for compiled modules
+    _run(True, env)
+
+    plain, ours = list(), list()
+    for _ in range(runs):
+        plain.append(_run(False, env))
+        ours.append(_run(True, env))
+    yaml_import = min(x[0] for x in plain)
+    yaml_dump = min(x[2] for x in plain)
+    return {
+        "yaml_import_ms": yaml_import,
+        "import_ratio": min(x[1] for x in ours) / yaml_import,
+        "first_dump_ratio": min(x[2] for x in ours) / yaml_dump,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown, 0.5 is 50%%")
+    parser.add_argument("--update", action="store_true", help="save results as the new baseline")
+    args = parser.parse_args()
+
+    result = measure(args.runs)
+    for name, value in result.items():
+        print(f"{name}={value:.2f}")
+    ratios = {k: v for k, v in result.items() if k.endswith("_ratio")}
+
+    if args.update or not os.path.exists(BASELINE):
+        with open(BASELINE, "w") as file:
+            json.dump({k: round(v, 2) for k, v in ratios.items()}, file, indent=2)
+            file.write("\n")
+        return
+
+    with open(BASELINE) as file:
+        baseline = json.load(file)
+    failed = False
+    for name, value in ratios.items():
+        limit = baseline[name] * (1 + args.tolerance)
+        if value > limit:
+            print(f"regression: {name}={value:.2f} over {limit:.2f} (baseline {baseline[name]:.2f})")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
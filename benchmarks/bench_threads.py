@@ -0,0 +1,81 @@
+"""
+Dump many small documents from a thread pool with one shared dumper.
+
+    python benchmarks/bench_threads.py --docs 20000 --threads 1 2 4 8
+    python benchmarks/bench_threads.py --render-cache  # all threads share a RenderCache too
+
+Prints the throughput of the whole pool and of each thread. With the GIL the
+pool does about as much as one thread does alone, "scaling" near 1.0x means
+no lock contention beyond the GIL, less means threads wait for each other.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.curdir))
+
+import yaml
+
+import yaml_comments
+
+
+def make_document(n: int):
+    return {
+        "id": n,
+        "name": f"request-{n}",
+        "user": {"login": f"u{n % 100}", "roles": ["read", "write"]},
+        "items": [{"sku": f"s{(n + i) % 50}", "count": i} for i in range(5)],
+    }
+
+
+def make_rules():
+    return dict(
+        before={"^id$": "# request id", "^items/0$": "# first item"},
+        after={"^user$": "# end of user", "^items/\\d+/count$": "# pieces"},
+        style={"^name$": yaml_comments.DOUBLE_QUOTE},
+        flow_style={"^user/roles$": yaml_comments.INLINE},
+    )
+
+
+def run(dumper, docs, threads: int) -> float:
+    def work(data) -> int:
+        stream = io.StringIO()
+        yaml.dump(data, stream, dumper)
+        return len(stream.getvalue())
+
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(work, docs[: threads * 10]))  # threads started and warm
+        start = time.perf_counter()
+        list(pool.map(work, docs, chunksize=16))
+        return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=20_000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--render-cache", action="store_true")
+    args = parser.parse_args()
+
+    cache = yaml_comments.RenderCache() if args.render_cache else None
+    dumper = yaml_comments.create_dumper(**make_rules(), render_cache=cache)
+    docs = [make_document(n) for n in range(args.docs)]
+
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"docs={args.docs} gil={'on' if gil else 'off'} render_cache={'off' if cache is None else 'on'}")
+    single = None
+    for threads in args.threads:
+        elapsed = run(dumper, docs, threads)
+        rate = args.docs / elapsed
+        single = single or rate / threads
+        print(
+            f"threads={threads:<3} time={elapsed:.2f}s docs/s={rate:,.0f} "
+            f"per-thread={rate / threads:,.0f} scaling={rate / single:.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import functools
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.curdir))
+
+import pytest
+import yaml
+
+import yaml_comments
+
+
+DUMPER = yaml_comments.create_dumper(
+    before={"^0$": "# first entry", "^3/user$": "# fourth user"},
+    after={"^\\d+$": "# ---"},
+    style={"^\\d+/note$": yaml_comments.LITERAL},
+)
+
+
+def entries(first: int, count: int):
+    return [{"id": x, "user": f"u{x}", "note": f"line {x}\nmore\n"} for x in range(first, first + count)]
+
+
+def read(path: str, encoding: str = "utf-8") -> str:
+    with open(path, encoding=encoding) as file:
+        return file.read()
+
+
+class Tests:
+    @pytest.mark.parametrize("encoding", ["utf-8", "utf-16"])
+    def test_same_as_one_dump(self, tmp_path, encoding) -> None:
+        path = str(tmp_path / "log.yaml")
+        count = yaml_comments.append_items(entries(0, 2), path, DUMPER, encoding=encoding, explicit_start=True)
+        assert count == 2
+        count = yaml_comments.append_items(entries(2, 1), path, DUMPER, encoding=encoding, explicit_start=True)
+        count = yaml_comments.append_items(entries(3, 2), path, DUMPER, start=count, encoding=encoding)
+        assert count == 5
+        expected = yaml.dump(entries(0, 5), Dumper=DUMPER, explicit_start=True)
+        assert read(path, encoding) == expected
+
+    def test_nothing_to_append(self, tmp_path) -> None:
+        path = str(tmp_path / "log.yaml")
+        assert yaml_comments.append_items([], path, DUMPER) == 0
+        assert not os.path.exists(path)
+
+    def test_missing_newline(self, tmp_path) -> None:
+        path = tmp_path / "log.yaml"
+        path.write_text("# old entries\n- 1\n- 2")
+        assert yaml_comments.append_items([3], str(path), DUMPER) == 3
+        assert path.read_text() == "# old entries\n- 1\n- 2\n- 3\n# ---\n"
+
+    @pytest.mark.parametrize("text", ["a: 1\n", "[]\n", "- 1\n...\n", "- 1\n---\n- 2\n"])
+    def test_not_a_block_sequence(self, tmp_path, text) -> None:
+        path = tmp_path / "log.yaml"
+        path.write_text(text)
+        with pytest.raises(ValueError):
+            yaml_comments.append_items([1], str(path), DUMPER)
+        assert path.read_text() == text
+
+    def test_count_sidecar(self, tmp_path, monkeypatch) -> None:
+        path = tmp_path / "log.yaml"
+        path.write_text("- 1\n- 2\n")
+        assert yaml_comments.append_items([3], str(path), DUMPER) == 3
+        assert (tmp_path / "log.yaml.count").read_text() == f"3 {path.stat().st_size}\n"
+
+        def scan(path, encoding):
+            raise AssertionError("scanned")
+
+        monkeypatch.setattr(yaml_comments.append, "_scan", scan)
+        assert yaml_comments.append_items([4], str(path), DUMPER) == 4
+        with pytest.raises(ValueError):
+            yaml_comments.append_items([5], str(path), DUMPER, start=3)
+        assert yaml.safe_load(path.read_text()) == [1, 2, 3, 4]
+        monkeypatch.undo()
+
+        # changed by something else, the sidecar no longer matches the size
+        with open(path, "a") as file:
+            file.write("- 5\n")
+        assert yaml_comments.append_items([6], str(path), DUMPER) == 6
+        assert yaml.safe_load(path.read_text()) == [1, 2, 3, 4, 5, 6]
+
+    def test_without_sidecar(self, tmp_path) -> None:
+        path = tmp_path / "log.yaml"
+        assert yaml_comments.append_items([1, 2], str(path), DUMPER, sidecar=False) == 2
+        assert yaml_comments.append_items([3], str(path), DUMPER, sidecar=False) == 3
+        assert os.listdir(tmp_path) == ["log.yaml"]
+
+    @pytest.mark.parametrize("flow", [dict(flow_style={".*": True}), dict(default_flow_style=None)])
+    def test_flow_style_at_the_root(self, tmp_path, flow) -> None:
+        path = tmp_path / "log.yaml"
+        dumper = yaml_comments.create_dumper(flow_style=flow.get("flow_style"))
+        kwds = {k: v for k, v in flow.items() if k != "flow_style"}
+        yaml_comments.append_items([[1, 2]], str(path), dumper, **kwds)
+        yaml_comments.append_items([[3]], str(path), dumper, **kwds)
+        assert path.read_text() == "- [1, 2]\n- [3]\n"
+        assert yaml.safe_load(path.read_text()) == [[1, 2], [3]]
+
+    def test_first_index(self) -> None:
+        text = yaml.dump(entries(3, 1), Dumper=functools.partial(DUMPER, first_index=3))
+        assert text == "- id: 3\n  note: |\n    line 3\n    more\n  # fourth user\n  user: u3\n# ---\n"
@@ -0,0 +1,71 @@
+import io
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.curdir))
+
+import pytest
+import yaml
+
+import yaml_comments
+from yaml_comments.cli import main
+
+
+RULES = {"before": {"^a$": "# before a"}, "after": {"^b$": "# after b"}, "style": {"^c$": "\""}}
+
+
+class Tests:
+    @pytest.fixture
+    def tree(self, tmp_path):
+        inputs = tmp_path / "in"
+        (inputs / "sub").mkdir(parents=True)
+        for i in range(6):
+            (inputs / f"f{i}.yaml").write_text(f"a: {i}\nb: [1, 2]\nc: x\n")
+        (inputs / "sub" / "g.json").write_text(json.dumps({"a": {"b": 1}, "c": "y"}))
+        (inputs / "notes.txt").write_text("skipped")
+        (tmp_path / "rules.yml").write_text(yaml.safe_dump(RULES))
+        return tmp_path
+
+    def expected(self, path) -> str:
+        with open(path) as file:
+            data = yaml.safe_load(file)
+        buffer = io.StringIO()
+        yaml.dump(data, buffer, yaml_comments.create_dumper(**RULES), allow_unicode=True)
+        return buffer.getvalue()
+
+    @pytest.mark.parametrize("jobs", ["1", "2"])
+    def test_directory(self, tree, jobs, capsys) -> None:
+        code = main(["-r", str(tree / "rules.yml"), "-o", str(tree / "out"), "-j", jobs, str(tree / "in")])
+        assert code == 0
+        for i in range(6):
+            assert (tree / "out" / f"f{i}.yaml").read_text() == self.expected(tree / "in" / f"f{i}.yaml")
+        assert (tree / "out" / "sub" / "g.yaml").read_text() == self.expected(tree / "in" / "sub" / "g.json")
+        assert not (tree / "out" / "notes.txt").exists()
+        assert "7 files" in capsys.readouterr().err
+
+    def test_in_place_and_errors(self, tree, capsys) -> None:
+        (tree / "in" / "bad.yml").write_text("a: [")
+        code = main(["-r", str(tree / "rules.yml"), "-i", "-q", str(tree / "in" / "f0.yaml"), str(tree / "in" / "bad.yml")])
+        assert code == 1
+        assert (tree / "in" / "f0.yaml").read_text() == "# before a\na: 0\nb:\n- 1\n- 2\n# after b\nc: \"x\"\n"
+        assert capsys.readouterr().err.startswith(str(tree / "in" / "bad.yml"))
+
+    def test_rules_cache(self, tree) -> None:
+        for _ in range(2):
+            args = ["-r", str(tree / "rules.yml"), "--rules-cache", str(tree / "cache"), "-o", str(tree / "out")]
+            assert main([*args, "-q", str(tree / "in" / "f1.yaml")]) == 0
+            assert (tree / "out" / "f1.yaml").read_text() == self.expected(tree / "in" / "f1.yaml")
+        assert len(list((tree / "cache").iterdir())) == 1
+
+    def test_skip_unchanged(self, tree, capsys) -> None:
+        args = ["-r", str(tree / "rules.yml"), "-o", str(tree / "out"), str(tree / "in")]
+        assert main(args) == 0
+        assert "(7 written, 0 unchanged)" in capsys.readouterr().err
+        (tree / "in" / "f3.yaml").write_text("a: 5\n")
+        assert main(args) == 0
+        assert "(1 written, 6 unchanged)" in capsys.readouterr().err
+
+    def test_bad_rules(self, tree) -> None:
+        (tree / "rules.yml").write_text("comments: {}")
+        assert main(["-r", str(tree / "rules.yml"), "-i", str(tree / "in")]) == 2
@@ -1,3 +1,4 @@
+import array
 import io
 import os
 import sys
@@ -5,6 +6,7 @@ from typing import Any, Dict, Union
 
 sys.path.insert(0, os.path.abspath(os.curdir))
 
+import pytest
 import yaml
 
 import yaml_comments
@@ -19,6 +21,9 @@ class Tests:
         style: Union[Dict[str, Any], None] = None,
         flow_style: Union[Dict[str, Any], None] = None,
         indent: int = 2,
+        width: Union[int, None] = None,
+        render_cache: Union[yaml_comments.RenderCache, None] = None,
+        dedupe: bool = False,
     ) -> str:
         # run custom dumper with args and return result
         dumper = yaml_comments.create_dumper(
@@ -27,9 +32,11 @@ class Tests:
             style=style,
             flow_style=flow_style,
             delimiter="/",
+            render_cache=render_cache,
+            dedupe=dedupe,
         )
         buffer = io.StringIO(initial_value="")
-        yaml.dump(data, buffer, dumper, indent=indent)
+        yaml.dump(data, buffer, dumper, indent=indent, width=width)
         buffer.seek(0)
         return buffer.getvalue()
 
@@ -311,6 +318,53 @@ a:
   # after b
 # after a0
 # after a
+""".lstrip()
+        )
+
+    def test_collections_in_list(self) -> None:
+        data = {"list": [["x", "y"], {"k": 1, "j": 2}, {"k": 3}]}
+        before = {
+            "^list/0$": "# before 0",
+            "^list/0/0$": "# before 00",
+            "^list/1$": "# before 1",
+            "^list/2$": "# before 2",
+        }
+        after = {"^list/0$": "# after 0", "^list/1$": "# after 1"}
+        result = self.dump_with_args(data, before=before, after=after)
+
+        assert (
+            result
+            == """
+list:
+# before 0
+- # before 00
+  - x
+  - y
+# after 0
+# before 1
+- j: 2
+  k: 1
+# after 1
+# before 2
+- k: 3
+""".lstrip()
+        )
+        assert yaml.safe_load(result) == data
+
+    def test_no_comments_inside_flow(self) -> None:
+        data = {"a": {"b": [1, 2], "c": 3}}
+        before = {"^a/b$": "# before b", "^a/b/0$": "# before b0"}
+        after = {"^a/b$": "# after b", "^a/b/1$": "# after b1"}
+        result = self.dump_with_args(data, before=before, after=after, flow_style={"^a/b$": yaml_comments.INLINE})
+
+        assert (
+            result
+            == """
+a:
+  # before b
+  b: [1, 2]
+  # after b
+  c: 3
 """.lstrip()
         )
 
@@ -680,3 +734,333 @@ a: {k1: v1, k2: v2}
 # after a
 """.lstrip()
         )
+
+    def test_array_inline(self) -> None:
+        data = {
+            "a": array.array("i", [1, 2, 3]),
+            "b": {"c": array.array("d", [0.5, 1e20, float("inf"), float("nan")])},
+        }
+        before = {"^a$": "# before a", "^b/c$": "# before c"}
+        after = {"^b/c$": "# after c"}
+        result = self.dump_with_args(data, before=before, after=after)
+
+        assert (
+            result
+            == """
+# before a
+a: [1, 2, 3]
+b:
+  # before c
+  c: [0.5, 1.0e+20, .inf, .nan]
+  # after c
+""".lstrip()
+        )
+
+    def test_array_same_as_list(self) -> None:
+        values = [0.1, -2.5, 3e-8, float("-inf"), 7.0]
+        data = [array.array("f", values), array.array("d", values), array.array("Q", [1, 2 ** 64 - 1])]
+        result = self.dump_with_args(data)
+        expected = yaml.dump([x.tolist() for x in data], default_flow_style=None)
+        assert result == expected
+
+    def test_array_long_unsplit(self) -> None:
+        data = {"a": array.array("q", range(1000))}
+        result = self.dump_with_args(data)
+        assert result.count("\n") == 1
+        assert yaml.safe_load(result) == {"a": list(range(1000))}
+
+    def test_numpy_array(self) -> None:
+        numpy = pytest.importorskip("numpy")
+        data = {
+            "a": numpy.arange(6, dtype=numpy.int64).reshape(2, 3),
+            "b": numpy.array([True, False]),
+            "c": numpy.linspace(0, 1, 5, dtype=numpy.float32),
+        }
+        after = {"^a$": "# after a"}
+        result = self.dump_with_args(data, after=after)
+        assert result.startswith("a: [[0, 1, 2], [3, 4, 5]]\n# after a\n")
+        assert yaml.safe_load(result) == {k: v.tolist() for k, v in data.items()}
+
+    def test_render_cache_same_output(self) -> None:
+        def block():
+            return {"cpu": "100m", "tags": ["a", "long text " * 10], "env": {"A": "1\n2\n"}}
+
+        data = {
+            "services": {f"s{i}": {"name": f"s{i}", "resources": block()} for i in range(5)},
+            "list": [block(), block(), [[block()], [block()]]],
+        }
+        before = {"^services/s1$": "# s1", "^list/1$": "# list 1", "^services/s2/resources$": "# res"}
+        after = {"^services/s3$": "# after s3", "^list/2/1$": "# after list 2 1"}
+        style = {"^services/s4/resources/cpu$": yaml_comments.DOUBLE_QUOTE}
+
+        for indent in (2, 4):
+            for width in (None, 20):
+                cache = yaml_comments.RenderCache()
+                args = dict(before=before, after=after, style=style, indent=indent, width=width)
+                expected = self.dump_with_args(data, **args)
+                result = self.dump_with_args(data, render_cache=cache, **args)
+                assert result == expected
+                assert cache.hits > 0
+
+    def test_render_cache_counters(self) -> None:
+        data = [{"a": [1, 2]} for _ in range(4)]
+        cache = yaml_comments.RenderCache(maxsize=1)
+        result = self.dump_with_args(data, render_cache=cache)
+
+        assert result == self.dump_with_args(data)
+        assert (cache.hits, cache.misses) == (3, 1)
+        assert cache.hit_rate == 0.75
+
+        self.dump_with_args({"x": [{"b": 1}, {"b": 1}]}, render_cache=cache)
+        assert len(cache) == 1
+        assert cache.evictions == 1
+
+    def test_dedupe_aliases(self) -> None:
+        data = {
+            "a": {"k": 1, "m": [1, 2]},
+            "b": {"k": 1, "m": [1, 2]},
+            "c": [[1, 2], {"z": [1, 2]}],
+            "d": [],
+        }
+        before = {"^b$": "# before b", "^c/0$": "# before c 0"}
+        result = self.dump_with_args(data, before=before, dedupe=True)
+        assert (
+            result
+            == """
+a: &id001
+  k: 1
+  m: &id002
+  - 1
+  - 2
+# before b
+b: *id001
+c:
+# before c 0
+- *id002
+- z: *id002
+d: []
+""".lstrip()
+        )
+        assert yaml.safe_load(result) == data
+        assert len(result) < len(self.dump_with_args(data, before=before))
+
+    def test_dedupe_shared_duplicate(self) -> None:
+        # a duplicate referenced twice is an alias of the first copy at both places
+        first, second = {"k": 1}, {"k": 1}
+        result = self.dump_with_args({"a": first, "x": second, "y": second}, dedupe=True)
+        assert result == "a: &id001\n  k: 1\nx: *id001\ny: *id001\n"
+
+    def test_dedupe_array_next_to_equal_string(self) -> None:
+        data = {"a": [array.array("i", [1, 2])], "b": ["[1, 2]"]}
+        result = self.dump_with_args(data, dedupe=True)
+        assert result == "a:\n- [1, 2]\nb:\n- '[1, 2]'\n"
+        assert yaml.safe_load(result) == {"a": [[1, 2]], "b": ["[1, 2]"]}
+
+    def test_dedupe_keeps_rules_inside(self) -> None:
+        data = {"a": {"k": 1, "s": "x"}, "b": {"k": 1, "s": "x"}, "c": {"k": 1, "s": "x"}}
+        before = {"^b/k$": "# k of b"}
+        style = {"^b/s$": yaml_comments.DOUBLE_QUOTE}
+        result = self.dump_with_args(data, before=before, style=style, dedupe=True)
+        assert (
+            result
+            == """
+a: &id001
+  k: 1
+  s: x
+b:
+  # k of b
+  k: 1
+  s: "x"
+c: *id001
+""".lstrip()
+        )
+        result = self.dump_with_args(data, flow_style={"^c$": yaml_comments.INLINE}, dedupe=True)
+        assert result == "a: &id001\n  k: 1\n  s: x\nb: *id001\nc: {k: 1, s: x}\n"
+
+    def test_shared_object_comments(self) -> None:
+        shared = {"k": 1}
+        data = {"a": shared, "b": shared, "c": [shared]}
+        after = {"^a$": "# after a", "^b$": "# after b", "^c/0$": "# after c 0"}
+        result = self.dump_with_args(data, after=after)
+        assert (
+            result
+            == """
+a: &id001
+  k: 1
+# after a
+b: *id001
+# after b
+c:
+- *id001
+# after c 0
+""".lstrip()
+        )
+
+    def test_encoded_output(self, tmp_path) -> None:
+        data = {"a": "ü€" * 20, "b": [1, 2]}
+        dumper = yaml_comments.create_dumper(before={"^a$": "# ä"}, after={"^b/1$": "# after"}, chunk_size=16)
+        expected = "# ä\na: ü€ü€ü€ü€ü€ü€ü€ü€ü€ü€ü€ü€ü€ü€ü€ü€ü€ü€ü€ü€\nb:\n- 1\n- 2\n# after\n"
+
+        assert yaml.dump(data, Dumper=dumper, allow_unicode=True) == expected
+        assert yaml.dump(data, Dumper=dumper, allow_unicode=True, encoding="utf-8") == expected.encode()
+
+        result = yaml_comments.dumps_bytes(data, dumper, allow_unicode=True)
+        assert isinstance(result, bytearray)
+        assert result == expected.encode()
+        result = yaml_comments.dumps_bytes(data, dumper, encoding="utf-16-le", allow_unicode=True)
+        assert result == "\ufeff".encode("utf-16-le") + expected.encode("utf-16-le")
+
+        path = tmp_path / "out.yaml"
+        with open(path, "wb") as file:
+            yaml.dump(data, file.fileno(), dumper, allow_unicode=True)
+        assert path.read_bytes() == expected.encode()
+
+    def test_large_scalar_streamed(self) -> None:
+        class Recorder(io.StringIO):
+            def __init__(self):
+                super().__init__()
+                self.largest = 0
+
+            def write(self, text):
+                self.largest = max(self.largest, len(text))
+                return super().write(text)
+
+        script = "".join(f"echo line {x}\n" for x in range(20000))
+        data = {"name": "job", "script": script, "after": [1]}
+        dumper = yaml_comments.create_dumper(
+            before={"^script$": "# the script"}, after={"^script$": "# end"}, style={"^script$": yaml_comments.LITERAL},
+            chunk_size=1024, max_buffer=4096,
+        )
+        expected = yaml.dump(data, Dumper=yaml_comments.create_dumper(
+            before={"^script$": "# the script"}, after={"^script$": "# end"}, style={"^script$": yaml_comments.LITERAL},
+            max_buffer=None,
+        ))
+        stream = Recorder()
+        instance = dumper(stream)
+        instance.open()
+        instance.represent(data)
+        assert instance.stream.buffer_size() < 4 * 8192  # 4 bytes per held character
+        instance.close()
+        instance.dispose()
+        assert stream.getvalue() == expected
+        assert "# end\n" in expected and len(expected) > 300000
+        assert stream.largest <= 1024
+
+    def test_encoded_output_chunks(self) -> None:
+        class Recorder(io.RawIOBase):
+            def __init__(self, limit: int):
+                self.limit = limit
+                self.chunks = list()
+
+            def write(self, data):
+                self.chunks.append(bytes(data[: self.limit]))  # raw streams may take a part only
+                return len(self.chunks[-1])
+
+        data = {"a": list(range(100))}
+        dumper = yaml_comments.create_dumper(chunk_size=32)
+        for limit, sizes in ((100, {32}), (10, {10, 2})):
+            stream = Recorder(limit)
+            yaml.dump(data, stream, dumper, encoding="utf-8")
+            assert b"".join(stream.chunks).decode() == self.dump_with_args(data)
+            assert {len(x) for x in stream.chunks[:-1]} == sizes
+
+    def test_stream_without_encoding_attribute(self) -> None:
+        class Sink:
+            def __init__(self):
+                self.parts = list()
+
+            def write(self, data):
+                self.parts.append(data)  # kept after write returns
+
+            def flush(self):
+                pass
+
+        dumper = yaml_comments.create_dumper()
+        for encoding, expected in ((None, "a: 1\n"), ("utf-8", b"a: 1\n")):
+            sink = Sink()
+            yaml.dump({"a": 1}, sink, dumper, encoding=encoding)
+            assert all(type(x) is type(expected) for x in sink.parts)
+            assert expected[:0].join(sink.parts) == expected
+
+    def test_flow_style_of_items(self) -> None:
+        dumper = yaml_comments.create_dumper(flow_style={"^a/1$": yaml_comments.INLINE})
+        assert yaml.dump({"a": [[1], [2], [3]]}, Dumper=dumper) == "a:\n- - 1\n- [2]\n- - 3\n"
+
+    def test_predicate_rules(self) -> None:
+        calls = list()
+
+        def late_container(path) -> bool:
+            # an index above 1 right under any "containers" key, not a key named "2"
+            calls.append(path)
+            if len(path) < 2 or not isinstance(path[-1], yaml_comments.SequenceKey):
+                return False
+            return path[-2].index == "containers" and path[-1].index > 1
+
+        def image(path) -> bool:
+            return len(path) > 0 and isinstance(path[-1], yaml_comments.MappingKey) and path[-1].index == "image"
+
+        data = {
+            "containers": [{"image": f"i{x}"} for x in range(4)],
+            "sidecars": {"containers": {"2": "not an item"}},
+        }
+        dumper = yaml_comments.create_dumper(
+            before={late_container: "# late"}, style={image: yaml_comments.DOUBLE_QUOTE}
+        )
+        assert yaml.dump(data, Dumper=dumper) == """
+containers:
+- image: "i0"
+- image: "i1"
+# late
+- image: "i2"
+# late
+- image: "i3"
+sidecars:
+  containers:
+    '2': not an item
+""".lstrip()
+
+        # the image paths have one shape, the predicate ran for it once, not for every item
+        shapes = [tuple(str(x) for x in path) for path in calls if len(path) == 3]
+        assert shapes == [("containers", "0", "image"), ("sidecars", "containers", "2")]
+
+    def test_predicate_on_a_key_like_an_item_path(self, monkeypatch) -> None:
+        # the key "x/1" and item 1 of x have the same path text, the predicate tells them apart
+        key = yaml_comments.MappingKey("x/1")
+        before = {lambda path: path[-1] == key: "# key"}
+        after = {lambda path: len(path) == 3: "# end of c"}
+        dumps = list()
+        dump = yaml_comments.hook_dumper._Dumper.serialize
+        monkeypatch.setattr(
+            yaml_comments.hook_dumper._Dumper, "serialize", lambda self, node: (dump(self, node), dumps.append(self))
+        )
+
+        data = {"x": [0, 1], "x/1": 5, "rows": [{"c": {"d": i}} for i in range(50)]}
+        text = self.dump_with_args(data, before=before, after=after)
+        assert text.startswith("rows:\n- c:\n    d: 0\n  # end of c\n- c:\n")
+        assert text.endswith("x:\n- 0\n- 1\n# key\nx/1: 5\n")
+        # hits are dropped once their comments are written, no path is kept for the whole dump
+        assert (dumps[0]._before_hits, dumps[0]._after_hits) == (dict(), dict())
+
+    def test_record_rows(self, monkeypatch) -> None:
+        rows = [
+            {"id": i, "name": f"item-{i}", "host": "yes" if i == 3 else f"h{i}", "cpu": -i, "memory": 0.5 * i}
+            for i in range(8)
+        ]
+        data = {"rows": rows, "nested": [[dict(x) for x in rows[:3]]], "mixed": [{"a": 1}, {"b": "two words"}]}
+        assert self.dump_with_args(data) == yaml.dump(data)
+        assert self.dump_with_args(data, indent=4) == yaml.dump(data, indent=4)
+
+        # per-index rules on rows and cells, per-column style rules
+        args = dict(
+            before={"^rows/2$": "# row 2", "^rows/4/name$": "# name 4", "^nested/0/1$": "# nested 1"},
+            after={"^rows/5$": "# after row 5", "^rows/6/memory$": "# memory 6", "^mixed/1$": "# mixed"},
+            style={"^rows/\\d+/name$": yaml_comments.DOUBLE_QUOTE, "^rows/[0-9]*5/host$": yaml_comments.SINGLE_QUOTE},
+            flow_style={"^rows/7$": yaml_comments.INLINE},
+        )
+        for indent in (2, 4):
+            rendered = self.dump_with_args(data, indent=indent, **args)
+            assert 'name: "item-1"\n' in rendered and "host: 'yes'\n" in rendered
+            # the same as written node by node
+            with monkeypatch.context() as patch:
+                patch.setattr(yaml_comments.hook_dumper._Dumper, "_use_row", lambda *args: None)
+                assert rendered == self.dump_with_args(data, indent=indent, **args)
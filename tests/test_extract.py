@@ -0,0 +1,69 @@
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.curdir))
+
+import yaml
+
+import yaml_comments
+
+
+TEXT = """\
+# the name
+name: x  # kept out, end of line comments are not extracted
+list:
+# first
+- a
+- |
+  # part of the text
+  text
+- - 1
+  # second inner
+  - 2
+  # after inner
+# before other
+other: {a: 1}
+"""
+
+
+class Tests:
+    def test_before_and_after(self) -> None:
+        result = yaml_comments.extract_comments(TEXT)
+        assert result == {
+            "before": {
+                "^name$": "# the name",
+                "^list/0$": "# first",
+                "^list/2/1$": "# second inner",
+                "^other$": "# before other",
+            },
+            "after": {"^list/2/1$": "# after inner"},
+        }
+
+    def test_dash_comments(self) -> None:
+        # items starting on one line: the outer comments above it, the inner ones behind the dashes
+        text = "# outer\n- # inner\n  - # key\n    a: 1\n"
+        expected = {"^0$": "# outer", "^0/0$": "# inner", "^0/0/a$": "# key"}
+        assert yaml_comments.extract_comments(text)["before"] == expected
+        assert yaml.dump([[{"a": 1}]], Dumper=yaml_comments.create_dumper(before=expected)) == text
+
+    def test_block_scalar_is_not_a_comment(self) -> None:
+        text = "a: |\n  # text\n  more\nb: 1\n"
+        assert yaml_comments.extract_comments(text) == {"before": {}, "after": {}}
+
+    def test_sources(self) -> None:
+        expected = yaml_comments.extract_comments(TEXT)
+        assert yaml_comments.extract_comments(TEXT.encode()) == expected
+        assert yaml_comments.extract_comments(TEXT.encode("utf-16")) == expected
+        assert yaml_comments.extract_comments(io.StringIO(TEXT)) == expected
+
+    def test_delimiter(self) -> None:
+        result = yaml_comments.extract_comments("a:\n  # x\n  b: 1\n", delimiter=".")
+        assert result["before"] == {"^a\\.b$": "# x"}
+
+    def test_round_trip(self) -> None:
+        data = yaml.safe_load(TEXT)
+        dumper = yaml_comments.create_dumper(**yaml_comments.extract_comments(TEXT))
+        text = yaml.dump(data, Dumper=dumper, sort_keys=False)
+        assert yaml_comments.extract_comments(text) == yaml_comments.extract_comments(TEXT)
+        assert yaml.safe_load(text) == data
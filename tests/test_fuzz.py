@@ -0,0 +1,201 @@
+import io
+import os
+import random
+import re
+import sys
+import tempfile
+from typing import Any, Dict, Iterator, List, Tuple
+
+sys.path.insert(0, os.path.abspath(os.curdir))
+
+import yaml
+
+import yaml_comments
+from yaml_comments import DumpIndex, RenderCache, dump_indexed, redump
+
+
+# YAML_COMMENTS_FUZZ=20000 for a longer run, YAML_COMMENTS_FUZZ_SEED to repeat a failure
+ITERATIONS = int(os.environ.get("YAML_COMMENTS_FUZZ", "150"))
+SEED = int(os.environ.get("YAML_COMMENTS_FUZZ_SEED", "0"))
+
+KEYS = ["a", "b", "c", "name", "x1", "list", "0", "with space"]
+SCALARS = [
+    0, 1, -2.5, True, False, None, "", "x", "7", "two words", "multi\nline\n", "a\nb",
+    "a: b", "- c", "#h", "long text " * 12, "ünïcode",
+]
+STYLES = [
+    yaml_comments.SINGLE_QUOTE, yaml_comments.DOUBLE_QUOTE, yaml_comments.FOLDED, yaml_comments.LITERAL,
+]
+KWDS = [{}, {"indent": 4}, {"width": 20}, {"sort_keys": False}, {"allow_unicode": True}, {"explicit_start": True}]
+
+
+def random_value(rnd: random.Random, depth: int = 0) -> Any:
+    choice = rnd.random()
+    if depth >= 4 or choice < 0.35:
+        return rnd.choice(SCALARS)
+    if choice < 0.65:
+        return [random_value(rnd, depth + 1) for _ in range(rnd.randint(0, 4))]
+    return {rnd.choice(KEYS): random_value(rnd, depth + 1) for _ in range(rnd.randint(0, 4))}
+
+
+def random_data(rnd: random.Random) -> Dict[str, Any]:
+    data = {rnd.choice(KEYS): random_value(rnd) for _ in range(rnd.randint(1, 5))}
+    if rnd.random() < 0.2:
+        # repeated subtrees, for the render cache
+        shared = random_value(rnd, 1)
+        data.update({f"copy{i}": shared for i in range(3)})
+    return data
+
+
+def random_rows(rnd: random.Random) -> List[Dict[str, Any]]:
+    # records with the same keys, as written from a row template
+    keys = rnd.sample(KEYS, rnd.randint(1, 4))
+    values = SCALARS + ["-5", "a/b", "x.y", "yes", "123"]
+    return [{key: rnd.choice(values) for key in keys} for _ in range(rnd.randint(1, 6))]
+
+
+def paths(data: Any, prefix: Tuple[str, ...] = ()) -> Iterator[Tuple[Tuple[str, ...], Any]]:
+    yield prefix, data
+    if isinstance(data, dict):
+        for key, value in data.items():
+            yield from paths(value, prefix + (str(key),))
+    elif isinstance(data, list):
+        for index, value in enumerate(data):
+            yield from paths(value, prefix + (str(index),))
+
+
+def random_rules(rnd: random.Random, data: Any) -> Dict[str, Dict[str, Any]]:
+    found = [(p, v) for p, v in paths(data) if p]
+    every = ["/".join(p) for p, _ in found]
+    strings = ["/".join(p) for p, v in found if isinstance(v, str)]
+    collections = ["/".join(p) for p, v in found if isinstance(v, (dict, list))]
+
+    def pick(population: List[str], most: int) -> List[str]:
+        return rnd.sample(population, min(len(population), rnd.randint(0, most)))
+
+    def pattern(path: str) -> str:
+        # exact paths mostly, sometimes a suffix or a regex, so all rule kinds are used
+        choice = rnd.random()
+        if choice < 0.7:
+            return "^" + re.escape(path) + "$"
+        if choice < 0.85:
+            return re.escape(path.split("/")[-1]) + "$"
+        return "^" + re.escape(path).replace("/", "[/]") + "$"
+
+    return dict(
+        before={pattern(p): f"# before {p}" + ("\n# second line" if rnd.random() < 0.2 else "") for p in pick(every, 4)},
+        after={pattern(p): f"# after {p}" for p in pick(every, 4)},
+        style={pattern(p): rnd.choice(STYLES) for p in pick(strings, 3)},
+        flow_style={pattern(p): rnd.random() < 0.5 for p in pick(collections, 2)},
+    )
+
+
+def cases(count: int) -> Iterator[Tuple[Any, Dict[str, Dict[str, Any]], Dict[str, Any]]]:
+    rnd = random.Random(SEED)
+    for _ in range(count):
+        data = random_data(rnd)
+        yield data, random_rules(rnd, data), rnd.choice(KWDS)
+
+
+def dump(data: Any, dumper: Any, **kwds) -> str:
+    buffer = io.StringIO()
+    yaml.dump(data, buffer, dumper, **kwds)
+    return buffer.getvalue()
+
+
+def events(text: str) -> List[Tuple[Any, ...]]:
+    # everything the text means and how it is styled, comments and layout left out
+    return [
+        (type(x).__name__, getattr(x, "value", None), getattr(x, "style", None),
+         getattr(x, "flow_style", None), getattr(x, "implicit", None))
+        for x in yaml.parse(text)
+    ]
+
+
+def describe(data: Any, rules: Dict[str, Any], kwds: Dict[str, Any], text: str) -> str:
+    return f"\ndata={data!r}\nrules={rules!r}\nkwds={kwds!r}\n----\n{text}"
+
+
+class Tests:
+    def test_loads_back(self) -> None:
+        for data, rules, kwds in cases(ITERATIONS):
+            text = dump(data, yaml_comments.create_dumper(**rules), **kwds)
+            assert yaml.safe_load(text) == data, describe(data, rules, kwds, text)
+
+    def test_same_as_without_comments(self) -> None:
+        for data, rules, kwds in cases(ITERATIONS):
+            text = dump(data, yaml_comments.create_dumper(**rules), **kwds)
+            if rules["style"] or rules["flow_style"]:
+                plain = dump(data, yaml_comments.create_dumper(style=rules["style"], flow_style=rules["flow_style"]), **kwds)
+            else:
+                plain = yaml.dump(data, **kwds)
+            assert events(text) == events(plain), describe(data, rules, kwds, text + "----\n" + plain)
+
+    def test_without_style_rules_same_as_yaml_dump(self) -> None:
+        for data, _, kwds in cases(ITERATIONS // 3):
+            assert dump(data, yaml_comments.create_dumper(), **kwds) == yaml.dump(data, **kwds)
+
+    def test_optimized_modes_identical(self) -> None:
+        render_cache = RenderCache(maxsize=64)
+        with tempfile.TemporaryDirectory() as rules_cache:
+            for data, rules, kwds in cases(ITERATIONS):
+                expected = dump(data, yaml_comments.create_dumper(**rules), **kwds)
+                message = describe(data, rules, kwds, expected)
+
+                cached = yaml_comments.create_dumper(**rules, render_cache=render_cache)
+                assert dump(data, cached, **kwds) == expected, message
+                assert dump(data, cached, **kwds) == expected, message
+
+                # the second call loads the compiled rules from the cache
+                for _ in range(2):
+                    loaded = yaml_comments.create_dumper(**rules, rules_cache=rules_cache)
+                    assert dump(data, loaded, **kwds) == expected, message
+
+                # every complete line is written out at once, hooks only go back in the current one
+                small = yaml_comments.create_dumper(**rules, chunk_size=7, max_buffer=1)
+                assert dump(data, small, **kwds) == expected, message
+                for encoding, codec in (("utf-8", "utf-8"), ("utf-16-le", "utf-16")):
+                    encoded = yaml_comments.dumps_bytes(data, small, encoding=encoding, **kwds)
+                    assert encoded.decode(codec) == expected, message  # utf-16 drops the BOM
+
+    def test_redump_identical(self) -> None:
+        rnd = random.Random(SEED + 1)
+        for data, rules, kwds in cases(ITERATIONS // 2):
+            kwds = dict(kwds, default_flow_style=False)
+            dumper = yaml_comments.create_dumper(**rules)
+            text, index = dump_indexed(data, dumper, **kwds)
+            assert text == dump(data, dumper, **kwds)
+
+            new = dict(data)
+            for key in rnd.sample(list(new), rnd.randint(0, len(new))):
+                new[key] = random_value(rnd, 1)
+            if rnd.random() < 0.3:
+                new[rnd.choice(KEYS)] = random_value(rnd, 1)
+
+            text, index = redump(data, new, text, index, dumper, **kwds)
+            assert isinstance(index, DumpIndex)
+            assert text == dump(new, dumper, **kwds), describe(new, rules, kwds, text)
+
+    def test_dedupe_loads_back(self) -> None:
+        for data, rules, kwds in cases(ITERATIONS // 3):
+            text = dump(data, yaml_comments.create_dumper(**rules, dedupe=True), **kwds)
+            assert yaml.safe_load(text) == data, describe(data, rules, kwds, text)
+
+    def test_extract_round_trip(self) -> None:
+        # comments read back from a dump are written to the same places again
+        for data, rules, kwds in cases(ITERATIONS):
+            text = dump(data, yaml_comments.create_dumper(**rules), **kwds)
+            extracted = yaml_comments.extract_comments(text)
+            dumper = yaml_comments.create_dumper(style=rules["style"], flow_style=rules["flow_style"], **extracted)
+            assert dump(data, dumper, **kwds) == text, describe(data, rules, kwds, text)
+
+    def test_row_template_identical(self, monkeypatch) -> None:
+        rnd = random.Random(SEED + 2)
+        for _ in range(ITERATIONS):
+            data = {"rows": random_rows(rnd), "x": [random_rows(rnd), {"in": random_rows(rnd)}]}
+            rules, kwds = random_rules(rnd, data), rnd.choice(KWDS)
+            dumper = yaml_comments.create_dumper(**rules)
+            text = dump(data, dumper, **kwds)
+            with monkeypatch.context() as patch:
+                patch.setattr(yaml_comments.hook_dumper._Dumper, "_use_row", lambda *args: None)
+                assert dump(data, dumper, **kwds) == text, describe(data, rules, kwds, text)
@@ -0,0 +1,91 @@
+import copy
+import io
+import os
+import random
+import sys
+from typing import Any
+
+sys.path.insert(0, os.path.abspath(os.curdir))
+
+import yaml
+
+import yaml_comments
+
+
+BEFORE = {"^b$": "# before b", "c/0$": "# before c 0", "/a$": "# deep a"}
+AFTER = {"^c$": "# after c", "/b$": "# after b", "z/0$": "# after z 0"}
+
+SCALARS = [1, 1.0, True, None, "x", "7", "", "a\nb\n\n", "long text " * 12, [], {}]
+
+
+def random_value(rnd: random.Random, depth: int = 0) -> Any:
+    choice = rnd.random()
+    if depth > 3 or choice < 0.4:
+        return rnd.choice(SCALARS)
+    if choice < 0.7:
+        return [random_value(rnd, depth + 1) for _ in range(rnd.randint(1, 3))]
+    return {rnd.choice("abcz"): random_value(rnd, depth + 1) for _ in range(rnd.randint(1, 3))}
+
+
+class Tests:
+    def full_dump(self, data: Any, dumper: Any, **kwds) -> str:
+        buffer = io.StringIO()
+        yaml.dump(data, buffer, dumper, **kwds)
+        return buffer.getvalue()
+
+    def test_same_as_full_dump(self) -> None:
+        rnd = random.Random(0)
+        kwds_choices = [{}, {"indent": 4}, {"width": 20}, {"sort_keys": False}, {"explicit_start": True}]
+
+        for _ in range(200):
+            dumper = yaml_comments.create_dumper(before=BEFORE, after=AFTER)
+            kwds = rnd.choice(kwds_choices)
+            old = {k: random_value(rnd) for k in rnd.sample("abcdefgz", rnd.randint(1, 6))}
+            new = copy.deepcopy(old)
+            for _ in range(rnd.randint(0, 3)):
+                if rnd.random() < 0.3 and len(new) > 0:
+                    new.pop(rnd.choice(list(new)))
+                else:
+                    new[rnd.choice("abcdhz")] = random_value(rnd)
+
+            text, index = yaml_comments.dump_indexed(old, dumper, **kwds)
+            assert text == self.full_dump(old, dumper, **kwds)
+
+            result, new_index = yaml_comments.redump(old, new, text, index, dumper, **kwds)
+            assert result == self.full_dump(new, dumper, **kwds)
+            assert new_index.offsets == yaml_comments.dump_indexed(new, dumper, **kwds)[1].offsets
+
+    def test_only_changed_rendered(self) -> None:
+        dumper = yaml_comments.create_dumper(before={"^b/x$": "# x"})
+        old = {k: {"x": 1, "y": [1, 2]} for k in "abcd"}
+        text, index = yaml_comments.dump_indexed(old, dumper)
+        assert index.rendered == 4
+
+        new = dict(old, b={"x": True, "y": [1, 2]})
+        result, new_index = yaml_comments.redump(old, new, text, index, dumper)
+        assert new_index.rendered == 1
+        assert result == self.full_dump(new, dumper)
+        assert "# x\n  x: true\n" in result
+
+        result, new_index = yaml_comments.redump(new, new, result, new_index, dumper)
+        assert new_index.rendered == 0
+
+    def test_not_spliceable(self) -> None:
+        dumper = yaml_comments.create_dumper()
+        shared = [1, 2]
+        for data in ([1, 2], {}, {"a": shared, "b": shared}):
+            text, index = yaml_comments.dump_indexed(data, dumper)
+            assert index.offsets == []
+            result, _ = yaml_comments.redump(data, {"a": 1}, text, index, dumper)
+            assert result == "a: 1\n"
+
+    def test_shared_objects(self) -> None:
+        dumper = yaml_comments.create_dumper()
+        old = {"a": [1], "b": {"x": 1}}
+        text, index = yaml_comments.dump_indexed(old, dumper)
+
+        # shared between a changed and an unchanged entry, only a full dump writes the alias
+        new = dict(old, a=old["b"])
+        result, new_index = yaml_comments.redump(old, new, text, index, dumper)
+        assert result == self.full_dump(new, dumper) == "a: &id001\n  x: 1\nb: *id001\n"
+        assert (new_index.offsets, new_index.rendered) == ([], 1)
@@ -0,0 +1,70 @@
+import io
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.curdir))
+
+import yaml
+
+import yaml_comments
+
+
+DATA = {"rows": [{"id": i, "name": f"item-{i}", "tags": ["a", "b"]} for i in range(300)]}
+BEFORE = {"^rows/\\d+$": "# row"}
+AFTER = {"name$": "# name"}
+
+
+class Tests:
+    def test_report(self) -> None:
+        dumper = yaml_comments.create_dumper(before=BEFORE, after=AFTER)
+        text, report = yaml_comments.dump_with_report(DATA, Dumper=dumper)
+
+        expected = io.StringIO()
+        yaml.dump(DATA, expected, dumper)
+        assert text == expected.getvalue()
+
+        assert list(report.phases) == ["representer", "serializer", "flush"]
+        assert list(report.structures) == ["nodes", "cache", "hooks", "buffer"]
+        assert all(x > 0 for x in report.structures.values())
+        assert report.peak >= report.phases["serializer"].peak > 0
+        assert report.structures["buffer"] >= report.output == len(text)
+        assert "serializer" in report.format()
+        assert not tracemalloc.is_tracing()
+
+    def test_structures_grow_with_data(self) -> None:
+        # without comment rules no hook bookkeeping is kept at all
+        dumper = yaml_comments.create_dumper(before=BEFORE, after=AFTER)
+        _, small = yaml_comments.dump_with_report({"rows": DATA["rows"][:30]}, Dumper=dumper)
+        _, large = yaml_comments.dump_with_report(DATA, Dumper=dumper)
+        for name in ("nodes", "hooks", "buffer"):
+            assert large.structures[name] > small.structures[name]
+        # scalars leave the cache as they are written, only a few are held at once
+        assert small.structures["cache"] <= large.structures["cache"] < 2 * small.structures["cache"]
+
+    def test_peaks_during_dump(self) -> None:
+        # a large scalar is held until it is written, the buffer until its lines are written out
+        data = {"rows": DATA["rows"], "script": "echo x\n" * 2000}
+        _, held = yaml_comments.dump_with_report(data, Dumper=yaml_comments.create_dumper(max_buffer=None))
+        _, spilled = yaml_comments.dump_with_report(data, Dumper=yaml_comments.create_dumper(max_buffer=4096))
+
+        assert held.structures["cache"] > len(data["script"]) and spilled.structures["cache"] > len(data["script"])
+        assert held.structures["buffer"] >= 4 * held.output
+        assert spilled.structures["buffer"] < 4 * 2 * 4096  # 4 bytes per held character
+
+    def test_stream_and_encoding(self) -> None:
+        stream = io.BytesIO()
+        result, report = yaml_comments.dump_with_report(DATA, stream, encoding="utf-8")
+        assert result is None
+        assert stream.getvalue() == yaml.dump(DATA, encoding="utf-8")
+
+        encoded, _ = yaml_comments.dump_with_report(DATA, encoding="utf-8")
+        assert encoded == stream.getvalue()
+
+    def test_keeps_running_trace(self) -> None:
+        tracemalloc.start()
+        try:
+            yaml_comments.dump_with_report(DATA)
+            assert tracemalloc.is_tracing()
+        finally:
+            tracemalloc.stop()
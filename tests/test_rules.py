@@ -0,0 +1,190 @@
+import os
+import pickle
+import re
+import sys
+from typing import Union
+
+sys.path.insert(0, os.path.abspath(os.curdir))
+
+import pytest
+import yaml
+
+import yaml_comments
+from yaml_comments.rules import _MISSING, _RuleTable, _Rules, _load_rules
+
+
+RULES = [
+    "^a$",
+    "^a/b/1$",
+    "a/b",
+    "^rows/",
+    "name$",
+    "^rows/\\d+/name$",
+    "^rows/[02468]/id$",
+    "^a\\/b\\.c$",
+    "(?i)^ROWS/3",
+    "^(x)/\\1$",
+    "",
+]
+
+PATHS = [
+    "",
+    "a",
+    "a\n",
+    "a/b",
+    "a/b/1",
+    "a/b/10",
+    "a/b.c",
+    "a/bxc",
+    "rows",
+    "rows/0/id",
+    "rows/3/id",
+    "rows/3/name",
+    "rows/12/name",
+    "x/x",
+    "x/y",
+    "zname",
+]
+
+
+class Tests:
+    def check_table(self, anchored: bool, table: Union[_RuleTable, None] = None) -> None:
+        rules = {rule: index for index, rule in enumerate(RULES)}
+        table = table or _RuleTable(rules, anchored=anchored)
+        regex_call = re.match if anchored else re.search
+
+        for path in PATHS:
+            expected = [v for k, v in rules.items() if regex_call(k, path)]
+            assert table.values(path) == expected, path
+            assert table.last(path) == (expected[-1] if expected else _MISSING), path
+
+    def test_search_table(self) -> None:
+        self.check_table(anchored=False)
+
+    def test_match_table(self) -> None:
+        self.check_table(anchored=True)
+
+    def test_empty_table(self) -> None:
+        table = _RuleTable(None, anchored=False)
+        assert len(table) == 0
+        assert table.values("a/b") == []
+        assert table.last("a/b", None) is None
+
+    def test_cached_rules(self, tmp_path) -> None:
+        rules = {rule: index for index, rule in enumerate(RULES)}
+        built = _load_rules(rules, rules, None, None, "/", str(tmp_path))
+        assert len(list(tmp_path.iterdir())) == 1
+
+        loaded = _load_rules(rules, rules, None, None, "/", str(tmp_path))
+        assert loaded is not built
+        self.check_table(anchored=True, table=loaded.style)
+        self.check_table(anchored=False, table=loaded.before)
+
+        # other delimiter or rules are stored separately
+        _load_rules(rules, rules, None, None, "#", str(tmp_path))
+        _load_rules(rules, None, None, None, "/", str(tmp_path))
+        assert len(list(tmp_path.iterdir())) == 3
+
+    def test_stale_cached_rules(self, tmp_path) -> None:
+        rules = {"^a$": "# a"}
+        _load_rules(None, rules, None, None, "/", str(tmp_path))
+        (path,) = tmp_path.iterdir()
+
+        # a cache of another version may refer to modules and names that do not exist here
+        other_version = (b"cyaml_comments.no_such_module\n_RuleTable\n.", b"cyaml_comments.rules\n_NoSuchTable\n.")
+        for content in (b"broken", pickle.dumps(((0, path.stem), _Rules())), *other_version):
+            path.write_bytes(content)
+            loaded = _load_rules(None, rules, None, None, "/", str(tmp_path))
+            assert loaded.before.values("a") == ["# a"]
+            assert pickle.loads(path.read_bytes())[0][0] != 0
+
+    def test_rules_read_only(self) -> None:
+        before = {"^a$": "# a"}
+        rules = _Rules(before=before)
+        before["^b$"] = "# b"
+        assert rules.before.values("b") == []
+        with pytest.raises(AttributeError):
+            rules.before = _RuleTable(None, anchored=False)
+        with pytest.raises(AttributeError):
+            rules.other = 1
+        copy = pickle.loads(pickle.dumps(rules))
+        assert copy.before.values("a") == ["# a"]
+
+    def test_predicate_memo(self) -> None:
+        from yaml_comments.hook_dumper import _PathView
+
+        calls = list()
+
+        def by_shape(path) -> bool:
+            calls.append("shape")
+            return path[0].index == "a"
+
+        def by_index(path) -> bool:
+            calls.append("index")
+            return path[-1].index % 2 == 0
+
+        table = _RuleTable({by_shape: 1, "^b/0$": 2, by_index: 3}, anchored=False)
+        for index in range(4):
+            view = _PathView.of([yaml_comments.MappingKey("a"), yaml_comments.SequenceKey(index)])
+            assert table.values(f"a/{index}", view) == ([1, 3] if index % 2 == 0 else [1])
+        assert calls.count("shape") == 1
+        assert calls.count("index") == 4
+
+        # without a view (no structured path) only the text rules apply
+        assert table.values("b/0") == [2]
+
+        # comparing segments reads the index too
+        table = _RuleTable({lambda path: path[-1] == yaml_comments.SequenceKey(1): 1}, anchored=False)
+        for index in range(3):
+            view = _PathView.of([yaml_comments.MappingKey("a"), yaml_comments.SequenceKey(index)])
+            assert table.values(f"a/{index}", view) == ([1] if index == 1 else [])
+        assert yaml_comments.MappingKey("1") != yaml_comments.SequenceKey(1)
+
+        table = _RuleTable({bool: 1}, anchored=False)
+        assert table.values("a", _PathView.of([yaml_comments.MappingKey("a")])) == [1]
+        assert len(table._memo) == 1
+        assert pickle.loads(pickle.dumps(table))._memo == {}
+
+    def test_memo_bounded(self, monkeypatch) -> None:
+        import uuid
+
+        from yaml_comments.hook_dumper import _PathView
+        from yaml_comments.rules import _ANY_KEY, _Template
+
+        monkeypatch.setattr(yaml_comments.rules, "_MEMO_SIZE", 100)
+        table = _RuleTable({lambda path: path[0].index == "a": 1, _Template(("a", _ANY_KEY)): 2}, anchored=False)
+        for _ in range(300):
+            key = str(uuid.uuid4())
+            view = _PathView.of([yaml_comments.MappingKey("a"), yaml_comments.MappingKey(key)])
+            assert table.values(f"a/{key}", view) == [1, 2]
+            assert len(table._memo) <= 100
+
+        dumper = yaml_comments.create_dumper(before={lambda path: len(path) == 2: "# id"})
+        text = yaml.dump({"ids": {str(uuid.uuid4()): 1 for _ in range(300)}}, Dumper=dumper)
+        assert text.count("# id") == 300
+
+    def test_predicates_not_cached(self, tmp_path) -> None:
+        rules = _load_rules(None, {callable: "# all"}, None, None, "/", str(tmp_path))
+        assert len(rules.before.predicates) == 1
+        assert list(tmp_path.iterdir()) == []
+
+    def test_template_rules(self) -> None:
+        from yaml_comments.hook_dumper import _PathView
+        from yaml_comments.rules import _ANY_KEY, _ITEM, _Template
+
+        table = _RuleTable(
+            {
+                _Template(("a", _ITEM)): 1,
+                _Template(("a", _ANY_KEY)): 2,
+                _Template(("a", re.compile("^x"))): 3,
+                _Template(("a", "x1")): 4,
+            },
+            anchored=True,
+        )
+        key, item = yaml_comments.MappingKey, yaml_comments.SequenceKey
+        assert table.values("a/0", _PathView.of([key("a"), item(0)])) == [1]
+        assert table.values("a/x1", _PathView.of([key("a"), key("x1")])) == [2, 3, 4]
+        assert table.values("a/0", _PathView.of([key("a"), key("0")])) == [2]
+        assert table.values("a", _PathView.of([key("a")])) == []
+        assert table.values("a/x1") == []  # templates need the structured path
+        assert table.structural and not _RuleTable({"^a$": 1}, anchored=True).structural
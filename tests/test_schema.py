@@ -0,0 +1,181 @@
+import os
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.abspath(os.curdir))
+
+import pytest
+import yaml
+
+import yaml_comments
+
+
+SCHEMA = {
+    "type": "object",
+    "$defs": {"port": {"type": "integer", "description": "TCP port"}},
+    "properties": {
+        "name": {"type": "string", "description": "Service name"},
+        "started": {"type": "string", "format": "date"},
+        "ports": {"type": "array", "description": "Open ports\nfor everyone", "items": {"$ref": "#/$defs/port"}},
+        "weights": {"type": "array", "items": {"type": "number"}},
+        "containers": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "image": {"type": "string", "description": "Image name"},
+                    "script": {"type": "string", "contentMediaType": "text/x-shellscript"},
+                },
+            },
+        },
+        "env": {"type": "object", "additionalProperties": {"type": "string", "description": "variable"}},
+        "labels": {"patternProperties": {"^x-": {"title": "extension"}}},
+    },
+}
+DATA = {
+    "name": "web",
+    "started": "2024-01-02",
+    "ports": [80, 443],
+    "weights": [0.5, 1.5],
+    "containers": [{"image": "nginx", "script": "echo 1\necho 2\n"}],
+    "env": {"A": "1"},
+    "labels": {"x-team": "a", "tier": "b"},
+}
+EXPECTED = """
+# Service name
+name: web
+started: "2024-01-02"
+# Open ports
+# for everyone
+ports:
+# TCP port
+- 80
+# TCP port
+- 443
+weights: [0.5, 1.5]
+containers:
+- # Image name
+  image: nginx
+  script: |
+    echo 1
+    echo 2
+env:
+  # variable
+  A: '1'
+labels:
+  # extension
+  x-team: a
+  tier: b
+""".lstrip()
+
+
+@dataclass
+class Container:
+    image: str = field(metadata={"description": "Image name"})
+    script: str = field(default="", metadata={"contentMediaType": "text/x-shellscript"})
+
+
+@dataclass
+class Service:
+    name: str = field(metadata={"description": "Service name"})
+    started: str = field(metadata={"format": "date"})
+    ports: List[int] = field(metadata={"description": "Open ports\nfor everyone"})
+    weights: List[float]
+    containers: List[Container]
+    env: Dict[str, str]
+    labels: Optional[Dict[str, str]] = None
+
+
+@dataclass
+class Node:
+    name: str = field(metadata={"description": "Node name"})
+    left: Optional["Node"] = field(default=None, metadata={"description": "left child"})
+
+
+@dataclass
+class Tree:
+    root: Node
+    spare: List[Node]
+
+
+class Tests:
+    def test_json_schema(self) -> None:
+        dumper = yaml_comments.create_dumper(**yaml_comments.schema_rules(SCHEMA))
+        assert yaml.dump(DATA, Dumper=dumper, sort_keys=False) == EXPECTED
+
+    def test_dataclass(self) -> None:
+        dumper = yaml_comments.create_dumper(**yaml_comments.schema_rules(Service))
+        # List[int] has the type of its items, so it is written inline
+        expected = EXPECTED.replace("  # variable\n", "").replace("  # extension\n", "")
+        expected = expected.replace("ports:\n# TCP port\n- 80\n# TCP port\n- 443\n", "ports: [80, 443]\n")
+        assert yaml.dump(DATA, Dumper=dumper, sort_keys=False) == expected
+
+    def test_recursive_ref(self) -> None:
+        schema = {
+            "$ref": "#/definitions/node",
+            "definitions": {
+                "node": {"properties": {"child": {"$ref": "#/definitions/node", "description": "next"}}}
+            },
+        }
+        rules = yaml_comments.schema_rules(schema)
+        text = yaml.dump({"child": {"child": {"child": None}}}, Dumper=yaml_comments.create_dumper(**rules))
+        assert text == "# next\nchild:\n  child:\n    child: null\n"
+
+    def test_additional_properties_only_for_other_keys(self, tmp_path) -> None:
+        schema = {
+            "properties": {"name": {"description": "Name"}, "id": {"type": "integer"}},
+            "patternProperties": {"^x-": {"type": "string"}},
+            "additionalProperties": {"description": "Extra label"},
+        }
+        expected = "# Name\nname: a\nid: 1\nx-team: b\n# Extra label\ntier: c\n"
+        for cache in (None, str(tmp_path), str(tmp_path)):  # compiled, then loaded from the cache
+            dumper = yaml_comments.create_dumper(**yaml_comments.schema_rules(schema), rules_cache=cache)
+            data = {"name": "a", "id": 1, "x-team": "b", "tier": "c"}
+            assert yaml.dump(data, Dumper=dumper, sort_keys=False) == expected
+
+    def test_recursive_and_repeated_dataclasses(self) -> None:
+        # each dataclass is one entry of $defs, like a recursive $ref it is described down to the first repetition
+        schema = yaml_comments.schema._dataclass_schema(Tree)
+        assert sorted(schema["$defs"]) == [f"{Node.__module__}.Node", f"{Tree.__module__}.Tree"]
+        dumper = yaml_comments.create_dumper(**yaml_comments.schema_rules(Tree))
+        data = {
+            "root": {"name": "a", "left": {"name": "b", "left": {"name": "c"}}},
+            "spare": [{"name": "d"}],
+        }
+        assert yaml.dump(data, Dumper=dumper, sort_keys=False) == """
+root:
+  # Node name
+  name: a
+  # left child
+  left:
+    name: b
+    left:
+      name: c
+spare:
+- # Node name
+  name: d
+""".lstrip()
+
+    @pytest.mark.skipif(sys.version_info < (3, 10), reason="X | None annotations")
+    def test_union_type(self) -> None:
+        @dataclass
+        class Job:
+            started: str | None = field(default=None, metadata={"format": "date", "description": "Start"})
+
+        dumper = yaml_comments.create_dumper(**yaml_comments.schema_rules(Job))
+        assert yaml.dump({"started": "2024-01-02"}, Dumper=dumper) == '# Start\nstarted: "2024-01-02"\n'
+
+    def test_cached_and_copied(self) -> None:
+        first = yaml_comments.schema_rules(SCHEMA)
+        first["before"].clear()
+        second = yaml_comments.schema_rules(SCHEMA)
+        assert len(second["before"]) == 6
+        assert list(second["before"].values())[0] == "# Service name"
+
+    def test_rules_cache(self, tmp_path) -> None:
+        rules = yaml_comments.schema_rules(SCHEMA)
+        for _ in range(2):
+            dumper = yaml_comments.create_dumper(**rules, rules_cache=str(tmp_path))
+            assert yaml.dump(DATA, Dumper=dumper, sort_keys=False) == EXPECTED
+        assert len(list(tmp_path.iterdir())) == 1
@@ -0,0 +1,105 @@
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.curdir))
+
+import pytest
+import yaml
+
+import yaml_comments
+
+
+DATA = {
+    "version": 2,
+    "services": {
+        "web": {"image": "nginx", "ports": [80, 443]},
+        "db": {"image": "postgres", "env": {"user": "x"}},
+        "a/b": "plain",
+    },
+}
+BEFORE = {
+    "^version$": "# format version",
+    "^services/web$": "# the web server",
+    "^services/web/ports/0$": "# http",
+    "^services/db/env/user$": "# login",
+}
+AFTER = {"^services/web/ports$": "# no more ports", "^services/db$": "# after db", "^services$": "# end of services"}
+STYLE = {"^services/web/image$": yaml_comments.DOUBLE_QUOTE}
+
+
+def read(path: str) -> str:
+    with open(path) as file:
+        return file.read()
+
+
+class Tests:
+    @pytest.mark.parametrize("jobs", [1, 2])
+    def test_shards_keep_comments(self, tmp_path, jobs) -> None:
+        dumper = yaml_comments.create_dumper(before=BEFORE, after=AFTER, style=STYLE)
+        files = yaml_comments.dump_sharded(DATA, ["services"], str(tmp_path), dumper, jobs=jobs)
+
+        assert files == {"web": "web.yaml", "db": "db.yaml", "a/b": "a_b.yaml"}
+        assert sorted(os.listdir(tmp_path)) == ["a_b.yaml", "db.yaml", "index.yaml", "web.yaml"]
+        assert read(tmp_path / "web.yaml") == 'image: "nginx"\nports:\n# http\n- 80\n- 443\n# no more ports\n'
+        assert read(tmp_path / "db.yaml") == "env:\n  # login\n  user: x\nimage: postgres\n"
+        assert yaml.safe_load(read(tmp_path / "a_b.yaml")) == "plain"
+        assert (
+            read(tmp_path / "index.yaml")
+            == """
+services:
+  a/b: a_b.yaml
+  db: db.yaml
+  # after db
+  # the web server
+  web: web.yaml
+# end of services
+# format version
+version: 2
+""".lstrip()
+        )
+
+    def test_rules_see_full_paths(self, tmp_path) -> None:
+        dumper = yaml_comments.create_dumper(before=BEFORE, after=AFTER, style=STYLE)
+        yaml_comments.dump_sharded(DATA, ["services"], str(tmp_path), dumper, index=None)
+        whole = io.StringIO()
+        yaml.dump(DATA["services"]["web"], whole, dumper)
+        assert "# http" not in whole.getvalue()
+        assert "# http" in read(tmp_path / "web.yaml")
+        assert sorted(os.listdir(tmp_path)) == ["a_b.yaml", "db.yaml", "web.yaml"]
+
+    def test_sequence_split(self, tmp_path) -> None:
+        data = {"items": [{"id": 1}, {"id": 2}], "index": 0}
+        dumper = yaml_comments.create_dumper(before={"^items/1/id$": "# second"})
+        files = yaml_comments.dump_sharded(data, ["items"], str(tmp_path), dumper)
+
+        assert files == {0: "0.yaml", 1: "1.yaml"}
+        assert read(tmp_path / "1.yaml") == "# second\nid: 2\n"
+        assert yaml.safe_load(read(tmp_path / "index.yaml")) == {"items": ["0.yaml", "1.yaml"], "index": 0}
+
+    def test_name_collisions(self, tmp_path) -> None:
+        data = {"a b": 1, "a_b": 2, "index": 3}
+        files = yaml_comments.dump_sharded(data, [], str(tmp_path))
+        assert files == {"a b": "a_b.yaml", "a_b": "a_b-2.yaml", "index": "index-2.yaml"}
+        assert yaml.safe_load(read(tmp_path / "index.yaml")) == files
+
+    def test_bad_split(self, tmp_path) -> None:
+        with pytest.raises(ValueError):
+            yaml_comments.dump_sharded(DATA, ["missing"], str(tmp_path))
+        with pytest.raises(ValueError):
+            yaml_comments.dump_sharded(DATA, ["version"], str(tmp_path))
+
+    def test_jobs_with_render_cache_and_predicates(self, tmp_path) -> None:
+        expected = tmp_path / "expected"
+        yaml_comments.dump_sharded(DATA, ["services"], str(expected), yaml_comments.create_dumper(before=BEFORE))
+
+        # a cache has a lock, a lambda has no importable name, neither crosses a process boundary as it is
+        cache = yaml_comments.RenderCache()
+        dumpers = [
+            yaml_comments.create_dumper(before=BEFORE, render_cache=cache),
+            yaml_comments.create_dumper(before={**BEFORE, lambda path: False: "# never"}),
+        ]
+        for n, dumper in enumerate(dumpers):
+            out = tmp_path / str(n)
+            yaml_comments.dump_sharded(DATA, ["services"], str(out), dumper, jobs=2)
+            assert {x: read(out / x) for x in os.listdir(out)} == {x: read(expected / x) for x in os.listdir(expected)}
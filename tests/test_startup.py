@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.abspath(os.curdir))
+
+import pytest
+
+import yaml_comments
+
+
+# modules a plain "import yaml_comments" must not load, see benchmarks/bench_startup.py
+DEFERRED = [
+    "dataclasses",
+    "copy",
+    "hashlib",
+    "pickle",
+    "tempfile",
+    "tracemalloc",
+    "numpy",
+    "yaml_comments.append",
+    "yaml_comments.cli",
+    "yaml_comments.extract",
+    "yaml_comments.incremental",
+    "yaml_comments.memory",
+    "yaml_comments.render_cache",
+    "yaml_comments.schema",
+    "yaml_comments.shard",
+    "yaml_comments.writer",
+]
+
+
+class Tests:
+    def test_deferred_imports(self) -> None:
+        code = "import sys, yaml_comments; print(' '.join(sys.modules))"
+        env = dict(os.environ, PYTHONPATH=os.path.abspath(os.curdir))
+        output = subprocess.run(
+            [sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True
+        ).stdout
+        loaded = set(output.split())
+        assert "yaml_comments.hook_dumper" in loaded
+        assert [x for x in DEFERRED if x in loaded] == []
+
+    def test_lazy_attributes(self) -> None:
+        assert yaml_comments.RenderCache is yaml_comments.render_cache.RenderCache
+        assert callable(yaml_comments.redump)
+        assert "dump_indexed" in dir(yaml_comments)
+        with pytest.raises(AttributeError):
+            yaml_comments.missing
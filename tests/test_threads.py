@@ -0,0 +1,82 @@
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.curdir))
+
+import pytest
+import yaml
+
+import yaml_comments
+from yaml_comments import RenderCache
+
+
+def document(n: int):
+    workers = [{"image": "worker", "env": {"queue": f"q{x % 2}"}} for x in range(4)]
+    web = {"image": "nginx", "ports": [80, 443]}
+    return {"id": n, "name": f"doc {n}", "web": web, "workers": workers, "notes": ["a\nb\n", n * 2]}
+
+
+RULES = dict(
+    before={"^id$": "# the id", "/ports/0$": "# http"},
+    after={"^notes$": "# end of notes", "^web$": "# web done"},
+    style={"^notes/0$": yaml_comments.LITERAL, "^name$": yaml_comments.DOUBLE_QUOTE},
+    flow_style={"^web/ports$": yaml_comments.INLINE},
+)
+
+
+def dump(data, dumper) -> str:
+    stream = io.StringIO()
+    yaml.dump(data, stream, dumper)
+    return stream.getvalue()
+
+
+@pytest.fixture
+def switching():
+    # switch threads often, so that dumps interleave in the middle of hooks
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+class Tests:
+    @pytest.mark.parametrize("render_cache", [False, True])
+    def test_shared_dumper(self, tmp_path, switching, render_cache) -> None:
+        cache = RenderCache(maxsize=8) if render_cache else None
+        dumper = yaml_comments.create_dumper(**RULES, render_cache=cache, rules_cache=str(tmp_path))
+        expected = [dump(document(n), yaml_comments.create_dumper(**RULES)) for n in range(200)]
+
+        start = threading.Barrier(8)
+
+        def work(n: int) -> str:
+            if n < 8:
+                start.wait()
+            return dump(document(n), dumper)
+
+        with ThreadPoolExecutor(8) as pool:
+            assert list(pool.map(work, range(200))) == expected
+        if cache is not None:
+            assert cache.hits > 0 and len(cache) <= 8
+
+    def test_rules_copied(self) -> None:
+        before = {"^id$": "# the id"}
+        dumper = yaml_comments.create_dumper(before=before)
+        before["^name$"] = "# changed later"
+        assert "# changed later" not in dump(document(1), dumper)
+
+    def test_render_cache_from_threads(self, switching) -> None:
+        cache = RenderCache(maxsize=16)
+
+        def work(n: int) -> None:
+            for i in range(500):
+                key = (n * 7 + i) % 40
+                if cache.get(key) is None:
+                    cache.put(key, str(key))
+
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(work, range(8)))
+        assert len(cache) == 16
+        assert cache.hits + cache.misses == 8 * 500
@@ -0,0 +1,62 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.curdir))
+
+import pytest
+
+import yaml_comments
+
+
+class Tests:
+    @pytest.mark.parametrize("sidecar", [False, True])
+    def test_skip_unchanged(self, tmp_path, sidecar) -> None:
+        dumper = yaml_comments.create_dumper(before={"^a$": "# a"})
+        writer = yaml_comments.FileWriter(dumper, sidecar=sidecar, chunk_size=4)
+        path = str(tmp_path / "out.yaml")
+
+        assert writer.dump({"a": 1, "b": [1, 2]}, path)
+        assert open(path).read() == "# a\na: 1\nb:\n- 1\n- 2\n"
+        os.utime(path, (1, 1))
+
+        assert not writer.dump({"a": 1, "b": [1, 2]}, path)
+        assert os.stat(path).st_mtime == 1
+
+        assert writer.dump({"a": 1, "b": [1, 3]}, path)
+        assert open(path).read() == "# a\na: 1\nb:\n- 1\n- 3\n"
+        assert (writer.written, writer.skipped) == (2, 1)
+        assert sorted(os.listdir(tmp_path)) == ["out.yaml", "out.yaml.hash"][: 1 + sidecar]
+
+    def test_existing_file_without_sidecar(self, tmp_path) -> None:
+        path = tmp_path / "out.yaml"
+        path.write_text("a: 1\n")
+        path.chmod(0o640)
+
+        writer = yaml_comments.FileWriter(sidecar=True)
+        assert not writer.dump({"a": 1}, str(path))
+        assert (tmp_path / "out.yaml.hash").exists()
+
+        assert writer.dump({"a": 2}, str(path))
+        assert path.read_text() == "a: 2\n"
+        assert path.stat().st_mode & 0o777 == 0o640
+
+    def test_sidecar_after_failed_write(self, tmp_path, monkeypatch) -> None:
+        path = tmp_path / "out.yaml"
+        writer = yaml_comments.FileWriter(sidecar=True)
+        assert writer.dump({"a": 1}, str(path))
+
+        write_atomic = yaml_comments.writer._write_atomic
+
+        def failing(target, content):
+            if target == str(path):
+                raise OSError("disk full")
+            write_atomic(target, content)
+
+        monkeypatch.setattr(yaml_comments.writer, "_write_atomic", failing)
+        with pytest.raises(OSError):
+            writer.dump({"a": 2}, str(path))  # same size as "a: 1\n"
+        monkeypatch.undo()
+
+        assert path.read_text() == "a: 1\n"
+        assert writer.dump({"a": 2}, str(path))
+        assert path.read_text() == "a: 2\n"
@@ -1,9 +1,41 @@
 from .hook_dumper import (
     create_dumper,
+    dumps_bytes,
     SINGLE_QUOTE,
     DOUBLE_QUOTE,
     FOLDED,
     LITERAL,
     EXPAND,
     INLINE,
+    MappingKey,
+    SequenceKey,
 )
+
+# submodules that are not needed for a plain dump are imported on first use
+_LAZY = {
+    "RenderCache": "render_cache",
+    "DumpIndex": "incremental",
+    "dump_indexed": "incremental",
+    "redump": "incremental",
+    "FileWriter": "writer",
+    "MemoryReport": "memory",
+    "dump_with_report": "memory",
+    "dump_sharded": "shard",
+    "extract_comments": "extract",
+    "append_items": "append",
+    "schema_rules": "schema",
+}
+
+
+def __getattr__(name: str):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+
+    value = getattr(importlib.import_module(f".{_LAZY[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted([*globals(), *_LAZY])
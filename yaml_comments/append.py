@@ -0,0 +1,117 @@
+import functools
+import os
+from typing import Any, Iterable, Tuple, Type, Union
+
+import yaml
+
+from .hook_dumper import _Dumper, create_dumper
+from .writer import _read_text, _write_atomic
+
+# options that belong to the head of the document, not to items added at its end
+_HEAD = ("explicit_start", "version", "tags")
+
+
+def _scan(path: str, encoding: str) -> Tuple[int, bool]:
+    # number of items of the top-level block sequence and if the file ends with a newline,
+    # read line by line: items are the only lines starting with a dash at column 0
+    count = 0
+    newline = True
+    with open(path, encoding=encoding, newline="") as file:
+        for line in file:
+            newline = line.endswith("\n")
+            if line.startswith("\ufeff"):
+                line = line[1:]
+            if line.startswith("-") and line[1:2] in ("", " ", "\t", "\r", "\n"):
+                count += 1
+            elif line.startswith(("---", "%")) and count == 0:
+                continue
+            elif line[:1] not in ("", " ", "\t", "\r", "\n", "#"):
+                raise ValueError(
+                    f"{path} is not a single document with a block sequence at the top level: {line.rstrip()!r}"
+                )
+    return count, newline
+
+
+def _read_count(path: str, size: int) -> Union[int, None]:
+    # item count from "<path>.count" if it was written for a file of this size, None if it is stale or missing
+    text = _read_text(path + ".count")
+    try:
+        count, known = map(int, (text or "").split())
+    except ValueError:
+        return None
+    return count if known == size else None
+
+
+def _ends_with_newline(path: str, newline: bytes) -> bool:
+    with open(path, "rb") as file:
+        size = file.seek(0, os.SEEK_END)
+        if size < len(newline):
+            return True
+        file.seek(-len(newline), os.SEEK_END)
+        return file.read() == newline
+
+
+def append_items(
+    items: Iterable[Any],
+    path: str,
+    Dumper: Union[Type[_Dumper], None] = None,
+    start: Union[int, None] = None,
+    encoding: str = "utf-8",
+    sidecar: bool = True,
+    **kwds,
+) -> int:
+    """
+    Append items to the top-level block sequence of the YAML file at path,
+    creating the file if it does not exist, and return the number of items
+    in it now.
+
+    Only the new items are rendered and written at the end of the file, rules
+    see them at their indexes in the whole sequence, start for the first one.
+
+    With sidecar=True the count and the size of the file are kept in
+    "<path>.count", so the next call only has to compare the size. With
+    neither start nor a matching sidecar the items of the file are counted,
+    a scan of its lines without parsing. A start that differs from a
+    matching sidecar raises ValueError, one for a file changed by something
+    else is trusted.
+    """
+    items = list(items)
+    Dumper = Dumper or create_dumper()
+    bom = "".encode(encoding)
+    newline = "\n".encode(encoding)[len(bom):]
+
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    exists = size > len(bom)
+    known = _read_count(path, size) if exists and sidecar else None
+    if not exists:
+        start = 0
+    elif start is None and known is None:
+        start, ended = _scan(path, encoding)
+    else:
+        if start is None:
+            start = known
+        elif known is not None and start != known:
+            raise ValueError(f"start {start} does not match the {known} items of {path}")
+        ended = _ends_with_newline(path, newline)
+    if not items:
+        return start
+
+    if exists:
+        kwds = {k: v for k, v in kwds.items() if k not in _HEAD}
+    buffer = bytearray()
+    yaml.dump(items, buffer, functools.partial(Dumper, first_index=start), encoding=encoding, **kwds)
+    if exists:
+        if buffer.startswith(bom):
+            del buffer[: len(bom)]
+        if not ended:
+            buffer[:0] = newline
+
+    with open(path, "ab") as file:
+        file.write(buffer)
+        file.flush()
+        os.fsync(file.fileno())
+        size = file.tell()
+    if sidecar:
+        # only once the items are in place, a crash in between leaves a size that does not match
+        _write_atomic(path + ".count", f"{start + len(items)} {size}\n".encode())
+    return start + len(items)
@@ -0,0 +1,75 @@
+import array
+import re
+import sys
+from typing import Any, Union
+
+
+# elements formatted per batch, bounds the temporary python objects
+_BATCH = 1 << 16
+
+_INT_CODES = frozenset("bBhHiIlLqQ")
+_FLOAT_CODES = frozenset("fd")
+
+# same float text as SafeRepresenter.represent_float: "1e+20" is "1.0e+20"
+_BARE_EXPONENT = re.compile(r"(?<![\d.])(\d+)e")
+
+
+def _format_bool(value: bool) -> str:
+    return "true" if value else "false"
+
+
+def _format_batch(items: list, kind: str) -> str:
+    if kind == "i":
+        return ", ".join(map(str, items))
+    if kind == "b":
+        return ", ".join(map(_format_bool, items))
+    # fix the repr text of the whole batch instead of formatting one by one
+    text = ", ".join(map(repr, items))
+    if "n" in text:
+        text = text.replace("nan", ".nan").replace("inf", ".inf")
+    if "e" in text:
+        text = _BARE_EXPONENT.sub(r"\1.0e", text)
+    return text
+
+
+def _format_flat(data: Any, kind: str) -> str:
+    parts = list()
+    for start in range(0, len(data), _BATCH):
+        parts.append(_format_batch(data[start : start + _BATCH].tolist(), kind))
+    return "[" + ", ".join(parts) + "]"
+
+
+def _numpy_kind(data: Any) -> Union[str, None]:
+    kind = data.dtype.kind
+    if kind in "iu":
+        return "i"
+    if kind in "fb":
+        return kind
+    return None
+
+
+def _format_ndarray(data: Any, kind: str) -> str:
+    if data.ndim == 1:
+        return _format_flat(data, kind)
+    return "[" + ", ".join(_format_ndarray(x, kind) for x in data) + "]"
+
+
+def is_numeric_array(data: Any) -> bool:
+    if isinstance(data, array.array):
+        return data.typecode in _INT_CODES or data.typecode in _FLOAT_CODES
+    numpy = sys.modules.get("numpy")  # never imported here, only used if loaded
+    if numpy is not None and isinstance(data, numpy.ndarray):
+        return data.ndim > 0 and _numpy_kind(data) is not None
+    return False
+
+
+def format_array(data: Any) -> str:
+    """
+    Render a numeric array.array or numpy.ndarray as a YAML flow sequence,
+    exactly like dumping data.tolist() inline would, but without building
+    a node per element.
+    """
+    if isinstance(data, array.array):
+        kind = "i" if data.typecode in _INT_CODES else "f"
+        return _format_flat(data, kind)
+    return _format_ndarray(data, _numpy_kind(data))  # type: ignore
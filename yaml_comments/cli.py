@@ -0,0 +1,143 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Tuple, Union
+
+import yaml
+
+from .hook_dumper import create_dumper
+from .writer import FileWriter
+
+
+SUFFIXES = (".yml", ".yaml", ".json")
+
+_RULE_KEYS = ("before", "after", "style", "flow_style", "delimiter")
+
+# set in every worker process once, see _init_worker
+_writer: Any = None
+
+
+def load_rules(path: str) -> Dict[str, Any]:
+    with open(path, "rb") as file:
+        rules = yaml.safe_load(file) or dict()
+    if not isinstance(rules, dict):
+        raise ValueError(f"{path}: rules file must contain a mapping")
+    unknown = set(rules) - set(_RULE_KEYS)
+    if unknown:
+        raise ValueError(f"{path}: unknown rule sections: {', '.join(sorted(map(str, unknown)))}")
+    return rules
+
+
+def _find_inputs(paths: List[str]) -> Iterator[Tuple[str, str]]:
+    # yields (input path, path relative to the given root)
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path, os.path.basename(path)
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith(SUFFIXES):
+                    full = os.path.join(root, name)
+                    yield full, os.path.relpath(full, path)
+
+
+def _output_path(path: str, relative: str, output: Union[str, None]) -> str:
+    target = os.path.join(output, relative) if output is not None else path
+    if target.endswith(".json"):
+        target = target[: -len(".json")] + ".yaml"
+    return target
+
+
+def _init_worker(rules: Dict[str, Any], dump_args: Dict[str, Any], rules_cache: Union[str, None], sidecar: bool) -> None:
+    global _writer
+    _writer = FileWriter(create_dumper(**rules, rules_cache=rules_cache), sidecar=sidecar, **dump_args)
+
+
+def _annotate(task: Tuple[str, str]) -> Tuple[str, int, bool, Union[str, None]]:
+    source, target = task
+    try:
+        with open(source, "rb") as file:
+            raw = file.read()
+        if source.endswith(".json"):
+            data = json.loads(raw)
+        else:
+            data = yaml.load(raw, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        return source, len(raw), _writer.dump(data, target), None
+    except Exception as e:
+        return source, 0, False, f"{type(e).__name__}: {e}"
+
+
+def _parse_args(argv: Union[List[str], None]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="yaml-comments",
+        description="Write YAML and JSON files as YAML with comments and styles from a rules file.",
+    )
+    parser.add_argument("inputs", nargs="+", help="YAML or JSON files and directories")
+    parser.add_argument(
+        "-r", "--rules", required=True,
+        help="YAML or JSON file with before, after, style, flow_style and delimiter",
+    )
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("-o", "--output", help="directory to write results to")
+    target.add_argument("-i", "--in-place", action="store_true", help="overwrite inputs, JSON is written next to it as .yaml")
+    parser.add_argument("--rules-cache", help="directory to keep compiled rules in between runs")
+    parser.add_argument("--hash-sidecar", action="store_true", help="keep output hashes in <file>.hash to skip unchanged files faster")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of worker processes, 0 for one per CPU")
+    parser.add_argument("--indent", type=int, default=2)
+    parser.add_argument("--width", type=int, default=None)
+    parser.add_argument("--no-sort-keys", action="store_true", help="keep keys in the order of the input")
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not print the summary")
+    return parser.parse_args(argv)
+
+
+def main(argv: Union[List[str], None] = None) -> int:
+    args = _parse_args(argv)
+    try:
+        rules = load_rules(args.rules)
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        print(f"yaml-comments: {e}", file=sys.stderr)
+        return 2
+    dump_args = dict(indent=args.indent, width=args.width, sort_keys=not args.no_sort_keys, allow_unicode=True)
+
+    tasks = [
+        (path, _output_path(path, relative, args.output))
+        for path, relative in _find_inputs(args.inputs)
+    ]
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+    jobs = min(jobs, max(len(tasks), 1))
+
+    start = time.perf_counter()
+    if jobs == 1:
+        _init_worker(rules, dump_args, args.rules_cache, args.hash_sidecar)
+        results = list(map(_annotate, tasks))
+    else:
+        chunksize = max(1, len(tasks) // (jobs * 4))
+        with multiprocessing.Pool(jobs, _init_worker, (rules, dump_args, args.rules_cache, args.hash_sidecar)) as pool:
+            results = list(pool.imap_unordered(_annotate, tasks, chunksize))
+    elapsed = max(time.perf_counter() - start, 1e-9)
+
+    failed = 0
+    written = 0
+    size = 0
+    for path, read, changed, error in results:
+        size += read
+        written += changed
+        if error is not None:
+            failed += 1
+            print(f"{path}: {error}", file=sys.stderr)
+
+    if not args.quiet:
+        done = len(results) - failed
+        print(
+            f"{done} files ({written} written, {done - written} unchanged), {size / 1e6:.1f} MB in {elapsed:.2f}s: "
+            f"{done / elapsed:.1f} files/s, {size / 1e6 / elapsed:.1f} MB/s"
+            + (f", {failed} failed" if failed else ""),
+            file=sys.stderr,
+        )
+    return 1 if failed else 0
@@ -0,0 +1,202 @@
+import re
+from typing import IO, Any, Dict, List, Tuple, Union
+
+import yaml
+
+
+# lines with only a comment, possibly after the dashes of compact sequence items
+_COMMENT_LINE = re.compile(r"^[ \t]*((?:-[ \t]+)*)(#.*?)[ \t]*$", re.M)
+
+_Chain = List[Tuple[str, int]]  # paths with the column their comments are written at
+
+
+class _Collection:
+    __slots__ = ("sequence", "path", "column", "owner_column", "expect_key", "key", "index")
+
+    def __init__(self, sequence: bool, path: List[str], column: int, owner_column: Union[int, None]):
+        self.sequence = sequence
+        self.path = path
+        self.column = column  # of the dashes, for sequences
+        self.owner_column = owner_column  # of the key or the dash of the collection, None for the root
+        self.expect_key = True
+        self.key: Tuple[List[str], int] = ([], 0)
+        self.index = 0
+
+
+class _Extractor:
+    def __init__(self, text: str, delimiter: str):
+        self._text = text
+        self._delim = delimiter
+        self._comments = [(x.start(2), x.group(1).count("-"), x.group(2)) for x in _COMMENT_LINE.finditer(text)]
+        self._next = 0  # first comment not attributed yet
+        self._line = 0  # line of the comment at _offset
+        self._offset = 0
+
+        self._started: _Chain = list()  # collection items opened since the last leaf
+        self._ended: _Chain = list()  # the last leaf and collections closed after it, innermost first
+        self.before: Dict[str, List[str]] = dict()
+        self.after: Dict[str, List[str]] = dict()
+
+    def _join(self, path: List[str]) -> str:
+        return self._delim.join(path)
+
+    def _line_of(self, offset: int) -> int:
+        # comments are visited in order, so lines are counted incrementally
+        self._line += self._text.count("\n", self._offset, offset)
+        self._offset = offset
+        return self._line
+
+    def _column_of(self, offset: int) -> int:
+        return offset - (self._text.rfind("\n", 0, offset) + 1)
+
+    def _take(self, line: int) -> List[Tuple[int, int, str]]:
+        # comments on lines before line, with their columns and dashes in front
+        taken = list()
+        while self._next < len(self._comments):
+            offset, dashes, text = self._comments[self._next]
+            if self._line_of(offset) >= line:
+                break
+            taken.append((self._column_of(offset), dashes, text))
+            self._next += 1
+        return taken
+
+    def _skip(self, line: int) -> None:
+        # comment-like lines up to line are inside a scalar or a flow collection
+        while self._next < len(self._comments) and self._line_of(self._comments[self._next][0]) <= line:
+            self._next += 1
+
+    def _attribute(self, comments: List[Tuple[int, int, str]], started: _Chain, ended: _Chain) -> None:
+        # the started paths begin on one line, "- - x" or "- a: 1", a comment right
+        # after n dashes is before the n-th of them (counted on from the last such
+        # comment), one on its own line is before the current one if it is not
+        # right of it, otherwise after the innermost path ended at or left of it
+        first = 0  # lines after a comment behind dashes continue it at its column
+        for column, dashes, text in comments:
+            target = None
+            if dashes > 0 and started:
+                first = min(first + dashes, len(started) - 1)
+                target = (started[first][0], self.before)
+            elif started and column <= started[first][1]:
+                target = (started[first][0], self.before)
+            else:
+                target = next(((p, self.after) for p, c in ended if c <= column), None)
+            if target is None and ended:
+                target = (ended[-1][0], self.after)
+            elif target is None and started:
+                target = (started[0][0], self.before)
+            if target is not None and target[0]:
+                target[1].setdefault(target[0], list()).append(text)
+
+    def _leaf(self, path: List[str], column: int, line: int, before: bool) -> None:
+        # a scalar, an alias or a flow collection where the dumper calls its hooks
+        started = self._started + [(self._join(path), column)] if before else self._started
+        self._attribute(self._take(line), started, self._ended)
+        self._started = list()
+        self._ended = [(self._join(path), column)]
+
+    def run(self, events: Any) -> None:
+        stack: List[_Collection] = list()
+        flow = 0
+
+        for event in events:
+            if flow > 0:
+                if isinstance(event, (yaml.MappingStartEvent, yaml.SequenceStartEvent)):
+                    flow += 1
+                elif isinstance(event, (yaml.MappingEndEvent, yaml.SequenceEndEvent)):
+                    flow -= 1
+                    if flow == 0:
+                        self._skip(event.end_mark.line)
+                continue
+
+            if isinstance(event, (yaml.MappingEndEvent, yaml.SequenceEndEvent)):
+                done = stack.pop()
+                if done.owner_column is not None:
+                    self._ended.append((self._join(done.path), done.owner_column))
+                continue
+            if not isinstance(event, (yaml.ScalarEvent, yaml.AliasEvent, yaml.MappingStartEvent, yaml.SequenceStartEvent)):
+                continue
+
+            start = event.start_mark
+            parent = stack[-1] if stack else None
+            before = True
+            if parent is None:
+                path, column = [], None
+                before = False
+            elif parent.sequence:
+                if parent.index == 0:
+                    parent.column = self._dash_column(start, parent.column)
+                path, column = parent.path + [str(parent.index)], parent.column
+                parent.index += 1
+            elif parent.expect_key:
+                path, column = parent.path + [str(getattr(event, "value", ""))], start.column
+                parent.key = (path, column)
+                parent.expect_key = False
+            else:
+                path, column = parent.key
+                parent.expect_key = True
+                before = False
+
+            is_collection = isinstance(event, (yaml.MappingStartEvent, yaml.SequenceStartEvent))
+            if is_collection and not event.flow_style:
+                if before and column is not None:
+                    self._started.append((self._join(path), column))
+                sequence = isinstance(event, yaml.SequenceStartEvent)
+                stack.append(_Collection(sequence, path, start.column, column))
+                continue
+
+            line = start.line
+            if column is None:
+                self._take(line)  # document head, no path to attach to
+                continue
+            self._leaf(path, column, line, before)
+            if is_collection:
+                flow = 1
+            else:
+                end = event.end_mark
+                self._skip(end.line - 1 if end.column == 0 else end.line)
+
+        self._attribute(self._take(1 << 62), list(), self._ended)
+
+    def _dash_column(self, mark: Any, default: int) -> int:
+        # the dash is in front of the item, or alone before comment lines above it
+        end = mark.index
+        while True:
+            start = self._text.rfind("\n", 0, end) + 1
+            head = self._text[start:end].split("#", 1)[0].rstrip()
+            if head.endswith("-"):
+                return len(head) - 1
+            if head or start == 0:
+                return default
+            end = start - 1
+
+
+def extract_comments(source: Union[str, bytes, IO[Any]], delimiter: str = "/") -> Dict[str, Dict[str, str]]:
+    """
+    Read the full-line comments of a YAML document as before and after rule
+    tables with the same paths the dumper uses, so that
+
+        create_dumper(**extract_comments(text))
+
+    writes the comments back to the same places when the same data is dumped.
+    Comments at the end of a line with content are not kept.
+
+    The document is parsed once into events (with libyaml if available),
+    no nodes or python objects are built.
+    """
+    if not isinstance(source, (str, bytes)):
+        source = source.read()
+    if isinstance(source, bytes):
+        codec = "utf-16" if source[:2] in (b"\xff\xfe", b"\xfe\xff") else "utf-8-sig"
+        source = source.decode(codec)
+    text = source.lstrip("\ufeff")
+
+    extractor = _Extractor(text, delimiter)
+    extractor.run(yaml.parse(text, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader)))
+    return {
+        "before": {_rule(k): "\n".join(v) for k, v in extractor.before.items()},
+        "after": {_rule(k): "\n".join(v) for k, v in extractor.after.items()},
+    }
+
+
+def _rule(path: str) -> str:
+    return "^" + re.escape(path) + "$"
@@ -1,12 +1,21 @@
-import copy
+import array
+import codecs
+import collections
 import functools
 import io
+import os
 import re
-from dataclasses import dataclass
-from typing import IO, Any, Callable, Dict, Iterable, List, Tuple, Type, Union
+import sys
+from typing import IO, TYPE_CHECKING, Any, Callable, Dict, Iterable, List, NamedTuple, Sequence, Set, Tuple, Type, Union
 
 import yaml
 
+from .arrays import format_array, is_numeric_array
+from .rules import _MISSING, _Rules, _load_rules
+
+if TYPE_CHECKING:
+    from .render_cache import RenderCache
+
 
 SINGLE_QUOTE = "'"
 DOUBLE_QUOTE = "\""
@@ -18,30 +27,129 @@ EXPAND = False
 INLINE = True
 
 
-@dataclass
+# plain classes, not dataclasses: the dataclasses import costs more than the rest of the module
 class AbstractKey:
-    index: Any
+    __slots__ = ("index",)
+
+    def __init__(self, index: Any):
+        self.index = index
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(index={self.index!r})"
+
+    def __eq__(self, other: Any) -> bool:
+        # by kind, not by class: predicates get _IndexProbe segments, which must read other.index to note it
+        if not isinstance(other, AbstractKey):
+            return NotImplemented
+        if isinstance(self, _Sequence) != isinstance(other, _Sequence):
+            return False
+        return self.index == other.index
 
     def __str__(self) -> str:
         return str(self.index) if self.index is not None else ""
 
 
-@dataclass
 class _Mapping(AbstractKey):
+    __slots__ = ()
     index: Union[str, None]
 
 
-@dataclass
 class _Sequence(AbstractKey):
+    __slots__ = ()
     index: Union[int, None]
 
 
+class _Offset(_Sequence):
+    # items of a sequence continued from elsewhere, see append.py
+    __slots__ = ("offset",)
+
+    def __init__(self, index: Any, offset: int):
+        super().__init__(index)
+        self.offset = offset
+
+    def __str__(self) -> str:
+        return str(self.index + self.offset) if self.index is not None else ""
+
+
+# segment types of the paths that predicate rules get
+MappingKey = _Mapping
+SequenceKey = _Sequence
+
+
+class _IndexProbe(_Sequence):
+    # a sequence segment that notes when its index is read
+    __slots__ = ("_value", "_reads")
+
+    def __init__(self, index: int, reads: List[int]):
+        self._value = index
+        self._reads = reads
+
+    @property
+    def index(self) -> int:  # type: ignore
+        self._reads.append(self._value)
+        return self._value
+
+
+class _PathView(tuple):
+    """
+    Path of a node as predicate rules see it: a tuple of MappingKey segments
+    (index is the key, a str) and SequenceKey segments (index is an int).
+    """
+
+    shape: Tuple[Any, ...]  # keys of the mapping segments, None for items: the same for all items of a sequence
+
+    @classmethod
+    def of(cls, segments: Iterable[AbstractKey]) -> "_PathView":
+        view = cls(
+            _Sequence(int(str(x)) if x.index is not None else None) if isinstance(x, _Sequence) else _Mapping(x.index)
+            for x in segments
+        )
+        view.shape = tuple(None if isinstance(x, _Sequence) else x.index for x in view)
+        return view
+
+    def test(self, predicate: Callable[..., Any]) -> Tuple[bool, bool]:
+        # result of predicate and if it read a sequence index
+        reads: List[int] = list()
+        probe = tuple(_IndexProbe(x.index, reads) if isinstance(x, _Sequence) else x for x in self)
+        return bool(predicate(probe)), len(reads) > 0
+
+
 class _StreamWrapper(io.StringIO):
-    def __init__(self, stream: IO):
+    """
+    Holds the text of the current line and the lines before it, hooks move
+    back in it. Complete lines are written out once more than max_buffer
+    characters are held, None holds the whole document until it is closed.
+
+    The origin may be a text stream, a binary stream, a file descriptor or a
+    bytearray to append to. Output is encoded for descriptors, bytearrays and
+    streams without an encoding attribute when an encoding is given, like
+    yaml.Emitter does, incrementally and in chunks of chunk_size bytes.
+    """
+
+    def __init__(
+        self,
+        stream: Union[IO, int, bytearray],
+        encoding: Union[str, None] = None,
+        chunk_size: int = 1 << 20,
+        max_buffer: Union[int, None] = None,
+    ):
         self._origin = stream
         self._sync = io.StringIO()
+        self._chunk_size = chunk_size
+        self._max_buffer = max_buffer
+        self._spill_at = max_buffer  # a long unfinished line is not scanned again on every write
+        self._base = 0  # characters already written out, positions count them too
+        # same test as yaml.Emitter uses to decide if a stream takes bytes, descriptors and bytearrays always do
+        if isinstance(stream, (int, bytearray)):
+            self._encoding: Union[str, None] = encoding or "utf-8"
+        else:
+            self._encoding = encoding if not hasattr(stream, "encoding") else None
+        self._encoder: Any = None
+        self._pending = bytearray()
 
     def close(self) -> None:
+        if self.closed:
+            return
         self._myflush()
         self._sync.close()
 
@@ -50,18 +158,73 @@ class _StreamWrapper(io.StringIO):
         return self._sync.closed
 
     def fileno(self) -> int:
-        return self._origin.fileno()
+        if isinstance(self._origin, int):
+            return self._origin
+        return self._origin.fileno()  # type: ignore
 
     def _myflush(self) -> None:
         self._sync.seek(0, 0)
-        self._origin.write(self._sync.read())
-        self._origin.flush()
+        while True:
+            text = self._sync.read(self._chunk_size)
+            self._emit(text, final=not text)
+            if not text:
+                break
+        self.flush()
+
+    def _spill(self) -> None:
+        # writes out the complete lines, the current one stays for the hooks
+        text = self._sync.getvalue()
+        cut = text.rfind("\n") + 1
+        for start in range(0, cut, self._chunk_size):
+            self._emit(text[start : min(start + self._chunk_size, cut)])
+        self._sync = io.StringIO()
+        self._sync.write(text[cut:])
+        self._base += cut
+        self._spill_at = len(text) - cut + self._max_buffer  # type: ignore
+
+    def _emit(self, text: str, final: bool = False) -> None:
+        if self._encoding is None:
+            if text:
+                self._origin.write(text)  # type: ignore
+            return
+
+        if self._encoder is None:
+            self._encoder = codecs.getincrementalencoder(self._encoding)()
+            if self._encoding.lower().replace("_", "-") in ("utf-16-le", "utf-16-be"):
+                self._pending += self._encoder.encode("\ufeff")  # BOM, as yaml.Emitter writes for utf-16
+        self._pending += self._encoder.encode(text, final=final)
+        ready = len(self._pending)
+        if not final:
+            ready -= ready % self._chunk_size  # only whole chunks until the end
+        if ready > 0:
+            with memoryview(self._pending) as view, view[:ready] as chunk:
+                self._write_bytes(chunk)
+            del self._pending[:ready]
+
+    def _write_bytes(self, data: Any) -> None:
+        if isinstance(self._origin, bytearray):
+            self._origin += data
+            return
+        if not isinstance(self._origin, int):
+            data = bytes(data)  # the stream may keep what it gets, the view is released after the write
+        while len(data) > 0:
+            if isinstance(self._origin, int):
+                written = os.write(self._origin, data)
+            else:
+                written = self._origin.write(data)
+            # raw streams and descriptors may take only a part
+            if written is None or written >= len(data):
+                break
+            data = data[written:]
 
     def flush(self) -> None:
-        self._origin.flush()
+        if hasattr(self._origin, "flush"):
+            self._origin.flush()  # type: ignore
 
     def isatty(self) -> bool:
-        return self._origin.isatty()
+        if isinstance(self._origin, int):
+            return os.isatty(self._origin)
+        return hasattr(self._origin, "isatty") and self._origin.isatty()  # type: ignore
 
     def readable(self) -> bool:
         return self._sync.readable()
@@ -73,40 +236,67 @@ class _StreamWrapper(io.StringIO):
         return self._sync.readlines(__hint)
 
     def seek(self, __cookie: int, __whence: int = 0) -> int:
-        return self._sync.seek(__cookie, __whence)
+        if __whence == 0:
+            __cookie -= self._base
+        return self._base + self._sync.seek(__cookie, __whence)
 
     def seekable(self) -> bool:
         return self._sync.seekable()
 
     def tell(self) -> int:
-        return self._sync.tell()
+        return self._base + self._sync.tell()
 
-    def truncate(self, __size: Union[int, None] = ...) -> int:
-        return self._sync.truncate(__size)
+    def truncate(self, __size: Union[int, None] = None) -> int:
+        if __size is not None:
+            __size -= self._base
+        return self._base + self._sync.truncate(__size)
 
     def writable(self) -> bool:
         return self._sync.writable()
 
     def writelines(self, __lines: Iterable[str]) -> None:
-        return self._sync.writelines(__lines)
+        for line in __lines:
+            self.write(line)
 
     def write(self, __s: str) -> int:
-        return self._sync.write(__s)
+        written = self._sync.write(__s)
+        if self._spill_at is not None and self._sync.tell() > self._spill_at:
+            self._spill()
+        return written
 
     def read(self, __size: Union[int, None] = ...) -> str:
         return self._sync.read(__size)
 
+    def buffer_size(self) -> int:
+        # bytes held for text that is not written out yet, io.StringIO keeps 4 per char
+        if self.closed:
+            return len(self._pending)
+        pos = self._sync.tell()
+        end = self._sync.seek(0, 2)
+        self._sync.seek(pos)
+        return end * 4 + len(self._pending)
+
     def lastchar(self) -> Union[str, None]:
         pos = self.tell()
-        if pos <= 0:
-            return None
+        if pos <= self._base:
+            return "\n" if pos > 0 else None  # only complete lines are written out
         self.seek(pos - 1, 0)
         char = self.read(1)
         self.seek(0, 2)
         return char
 
+    def cut_line(self) -> str:
+        # removes the unfinished last line and returns it
+        end = self.tell()
+        self.seek_prev_line()
+        start = self.tell()
+        line = self.read(end - start)
+        self.seek(start)
+        self._sync.truncate()
+        return line
+
     def seek_prev_line(self) -> None:
-        while self.tell() > 0:
+        while self.tell() > self._base:
             self.seek(self.tell() - 1)
             if self.read(1) == "\n":
                 return
@@ -117,10 +307,42 @@ class _StreamWrapper(io.StringIO):
             self.close()
 
 
+class _InlineNode(yaml.ScalarNode):
+    """Scalar node holding an already rendered flow collection."""
+
+
+class _BlockNode(yaml.ScalarNode):
+    """Scalar node standing for a block collection rendered from RenderCache."""
+
+
+_EMPTY = {
+    yaml.resolver.BaseResolver.DEFAULT_SEQUENCE_TAG: "[]",
+    yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG: "{}",
+}
+
+# scalars the emitter writes as they are, or only quoted: no spaces, breaks,
+# indicators or escapes, see _Dumper._simple_text
+_SIMPLE = re.compile(r"-?[A-Za-z0-9_][A-Za-z0-9_.+\-/]*\Z")
+_STR_TAG = yaml.resolver.BaseResolver.DEFAULT_SCALAR_TAG
+
+
+class _Subtree(NamedTuple):
+    digest: bytes
+    first: str  # path of the first and the last scalar written inside
+    last: str
+
+
+class _Columns(NamedTuple):
+    # template of the rows of a sequence with the same keys, see _Dumper._use_row
+    names: Tuple[str, ...]  # path segments of the keys
+    keys: Tuple[str, ...]  # rendered keys with the colon
+
+
 class _Dumper(yaml.Dumper):
     _replace_marker_key = "__loc_dumper_key"
     _replace_marker_item = "__loc_dumper_item"
     _replace_marker_value = "__loc_dumper_value"
+    _replace_marker_prefix = "__loc_dumper_"
 
     def __init__(
         self,
@@ -130,33 +352,86 @@ class _Dumper(yaml.Dumper):
         after: Union[Dict[str, Any], None] = None,
         flow_style: Union[Dict[str, Any], None] = None,
         delimiter: str = "/",
+        rules: Union[_Rules, None] = None,
+        render_cache: Union["RenderCache", None] = None,
+        dedupe: bool = False,
+        chunk_size: int = 1 << 20,
+        max_buffer: Union[int, None] = 1 << 22,
+        root: Union[Sequence[Any], None] = None,
+        first_index: Union[int, None] = None,
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
-        self.stream = _StreamWrapper(self.stream)  # type: ignore
+        self.stream = _StreamWrapper(self.stream, self.use_encoding, chunk_size, max_buffer)  # type: ignore
 
         self._cache = dict()
-        self._path = list()
         self._delim = delimiter
-
-        self._style = style.copy() if isinstance(style, dict) else dict()
-        self._after = after.copy() if isinstance(after, dict) else dict()
-        self._before = before.copy() if isinstance(before, dict) else dict()
-        self._flow_style = flow_style.copy() if isinstance(flow_style, dict) else dict()
+        # keys and indexes of the data inside a larger document, rules see the full paths
+        self._root = list(root or ())
+        self._path = self._root_path()
+        # index of the first item when the data is a sequence continued from elsewhere,
+        # written as a block sequence whatever the rules say, a flow one could not go on
+        self._first_index = first_index
+
+        if rules is None:
+            rules = _Rules(style=style, before=before, after=after, flow_style=flow_style)
+        self._rules = rules
+        self._comments = len(rules.before) > 0 or len(rules.after) > 0  # without them no hook writes anything
+        # predicate and template rules see the live path of a node when it is entered, their hits
+        # are kept only until the hook of the path has run: before hits by path text and if it is
+        # an item, as a key "x/1" and item 1 of x have the same text, after hits by path text
+        tables = (rules.style, rules.flow_style, rules.before, rules.after)
+        self._structural = any(x.structural for x in tables)
+        self._before_hits: Dict[Tuple[str, bool], Set[int]] = dict()
+        self._after_hits: Dict[str, Set[int]] = dict()
 
         self._last_hooked_after = None
+        self._last_hooked_key = False  # _last_hooked_after is a key, its value was not hooked
+        self._last_flow_level = 0  # flow collections around _last_hooked_after
         self._last_hooked_before = None
         self._after_hook_cache = set()
         self._before_hook_cache = set()
 
         self._indent_cache = dict()
+        self._inline = set()
+
+        self._render_cache = render_cache
+        self._subtrees: Dict[int, _Subtree] = dict()
+        self._subtree_counts: Dict[bytes, int] = dict()
+        # rendered block collections by marker: the node, its first and last path,
+        # and the lines of a row written from a template (None for RenderCache blocks)
+        self._blocks: Dict[str, Tuple[yaml.Node, _Subtree, Union[List[str], None]]] = dict()
+        self._columns: Dict[Tuple[Any, ...], Union[_Columns, None]] = dict()
+        self._flow_nodes = 0  # flow collections around the current node
+
+        self._dedupe = dedupe
+        self._aliases: "collections.deque[Union[str, None]]" = collections.deque()
+
+        # where each top-level entry starts in the output, see incremental.py
+        self._top_keys = set()
+        self._offsets: List[int] = list()
+        self._has_anchors = False
+
+        numpy = sys.modules.get("numpy")
+        if numpy is not None and numpy.ndarray not in self.yaml_multi_representers:
+            _Dumper.add_multi_representer(numpy.ndarray, _Dumper.represent_array)
 
     def __del__(self):
         self.stream.__del__()  # type: ignore
 
+    def _root_path(self) -> List[AbstractKey]:
+        return [_Sequence(x) if isinstance(x, int) else _Mapping(x) for x in self._root]
+
+    def _is_root(self, path: str) -> bool:
+        # a scalar document dumped with a root, its comments belong to the outer document
+        return len(self._root) > 0 and self._get_level(path) < len(self._root)
+
     def _repr_path(self) -> str:
         return self._delim.join(str(x) for x in self._path)
 
+    def _view(self, segments: Sequence[AbstractKey]) -> Union[_PathView, None]:
+        return _PathView.of(segments) if self._structural else None
+
     def _is_last_sequence(self, path: str) -> bool:
         try:
             int(path.split(self._delim)[-1])
@@ -170,20 +445,33 @@ class _Dumper(yaml.Dumper):
         node.value = cache_path
 
     def _extract_marker(self, text: str) -> Tuple[Union[str, None], str]:
-        if text.startswith(self._replace_marker_key):
-            return self._replace_marker_key, text[text.find(":") + 1 :]
-        if text.startswith(self._replace_marker_value):
-            return self._replace_marker_value, text[text.find(":") + 1 :]
-        if text.startswith(self._replace_marker_item):
-            return self._replace_marker_item, text[text.find(":") + 1 :]
+        if not text.startswith(self._replace_marker_prefix):
+            return None, ""
+        marker_type, _, path = text.partition(":")
+        if marker_type in (self._replace_marker_key, self._replace_marker_value, self._replace_marker_item):
+            return marker_type, path
         return None, ""
 
-    def serialize_node(self, node, parent, index):
-        if isinstance(node, yaml.SequenceNode) or isinstance(node, yaml.MappingNode):
-            for rule, style in self._flow_style.items():
-                if re.match(rule, self._repr_path()):
-                    node.flow_style = style
-
+    def _enter_node(self, node: yaml.Node, index: Any) -> Union[str, None]:
+        # move current path into node, returns marker type for scalar nodes
+        marker_type = self._enter_path(node, index)
+        segments = self._path if isinstance(node, yaml.ScalarNode) else self._path[:-1]
+        if self._structural and self._comments and len(segments) > len(self._root):
+            view = _PathView.of(segments)
+            path = self._delim.join(str(x) for x in segments)
+            item = isinstance(segments[-1], _Sequence)
+            # a value has the path of its key, comments before it are written when the key is
+            if self._rules.before.structural and (index is None or item):
+                found = self._rules.before.structural_hits(view)
+                if found:
+                    self._before_hits.setdefault((path, item), set()).update(found)
+            if self._rules.after.structural and index is not None:
+                found = self._rules.after.structural_hits(view)
+                if found:
+                    self._after_hits.setdefault(path, set()).update(found)
+        return marker_type
+
+    def _enter_path(self, node: yaml.Node, index: Any) -> Union[str, None]:
         if isinstance(node, yaml.MappingNode):
             if len(self._path) > 0:
                 if isinstance(self._path[-1], _Sequence) and isinstance(index, int):
@@ -193,133 +481,558 @@ class _Dumper(yaml.Dumper):
             if len(self._path) > 0:
                 if isinstance(self._path[-1], _Sequence) and isinstance(index, int):
                     self._path[-1].index = index
-            self._path.append(_Sequence(None))
+            if self._first_index and len(self._path) == len(self._root):
+                self._path.append(_Offset(None, self._first_index))
+            else:
+                self._path.append(_Sequence(None))
         elif isinstance(node, yaml.ScalarNode):
             if len(self._path) > 0:
                 if isinstance(self._path[-1], _Mapping):
                     if index is None:  # key ScalarNode
                         self._path[-1].index = node.value
-                        self._cache_node(self._replace_marker_key, node)
+                        return self._replace_marker_key
                     else:  # value ScalarNode
-                        self._cache_node(self._replace_marker_value, node)
+                        return self._replace_marker_value
                 if isinstance(self._path[-1], _Sequence) and isinstance(index, int):
                     self._path[-1].index = index
-                    self._cache_node(self._replace_marker_item, node)
-
-        if isinstance(node, yaml.ScalarNode) and index is not None:
-            for rule, style in self._style.items():
-                if re.match(rule, self._repr_path()):
-                    node.style = style
-
-        super().serialize_node(node, parent, index)
+                    return self._replace_marker_item
+        return None
 
+    def _leave_node(self, node: yaml.Node, index: Any) -> None:
         if isinstance(node, yaml.MappingNode):
             self._path.pop()
         elif isinstance(node, yaml.SequenceNode):
             self._path.pop()
-        elif isinstance(node, yaml.ScalarNode):
+        elif isinstance(node, yaml.ScalarNode) and len(self._path) > 0:
             if isinstance(self._path[-1], _Mapping):
                 if index is not None:
                     self._path[-1].index = None
             if isinstance(self._path[-1], _Sequence) and isinstance(index, int):
                 self._path[-1].index = None
 
-    def analyze_scalar(self, scalar: str):
-        marker_type, _ = self._extract_marker(scalar)
+    def _scan_node(self, node: yaml.Node, index: Any, in_flow: bool) -> Tuple[bytes, bool, Any, Any]:
+        # walks node with the same path bookkeeping as serialize_node, without
+        # changing it, and returns (digest, no rule touches it, first, last path)
+        clean = self.anchors.get(node) is None
+        if not clean and id(node) in self._aliased:
+            # written once at the first place, an alias everywhere else
+            self._enter_node(node, index)
+            self._leave_node(node, index)
+            return self._aliased[id(node)], False, None, None
+
+        marker_type = self._enter_node(node, index)
+
+        if isinstance(node, yaml.ScalarNode):
+            path = self._repr_path() if marker_type is not None else None
+            if path is not None:
+                view = self._view(self._path)
+                if self._rules.before.matches(path, view) or self._rules.after.matches(path, view):
+                    clean = False
+                if index is not None and self._rules.style.matches(path, view):
+                    clean = False
+            if isinstance(node, _InlineNode):
+                clean = False
+            key = repr(("S", node.tag, node.style, node.value))
+            self._leave_node(node, index)
+            return self._blake2b(key.encode(), digest_size=16).digest(), clean, path, path
+
+        own_path = self._delim.join(str(x) for x in self._path[:-1])
+        view = self._view(self._path[:-1])
+        flow_style = node.flow_style
+        if len(self._rules.flow_style) > 0:
+            found = self._rules.flow_style.last(own_path, view=view)
+            if found is not _MISSING:
+                flow_style = found
+                clean = False
+        if self._rules.before.matches(own_path, view) or self._rules.after.matches(own_path, view):
+            clean = False
+
+        if isinstance(node, yaml.MappingNode):
+            children = [y for k, v in node.value for y in ((k, None), (v, k))]
+        else:
+            children = [(x, i) for i, x in enumerate(node.value)]
+
+        digest = self._blake2b(repr(("C", node.tag, flow_style)).encode(), digest_size=16)
+        inner_clean, first, last = True, None, None
+        for child, child_index in children:
+            child_digest, child_clean, child_first, child_last = self._scan_node(
+                child, child_index, in_flow or bool(flow_style)
+            )
+            digest.update(child_digest)
+            inner_clean = inner_clean and child_clean
+            first = first if first is not None else child_first
+            last = child_last if child_last is not None else last
+
+        self._leave_node(node, index)
+
+        digest_value = digest.digest()
+        if not clean:
+            self._aliased[id(node)] = digest_value
+        if inner_clean and clean and not in_flow and not flow_style and first is not None:
+            self._subtrees[id(node)] = _Subtree(digest_value, first, last)
+            self._subtree_counts[digest_value] = self._subtree_counts.get(digest_value, 0) + 1
+
+        return digest_value, inner_clean and clean, first, last
+
+    def _scan_document(self, node: yaml.Node) -> None:
+        if self.canonical or self.use_version or self.use_tags:
+            return
+        if self.best_line_break != "\n":
+            return
+        import hashlib  # deferred, only dumps with a render cache need it
+
+        self._blake2b = hashlib.blake2b
+        self._aliased: Dict[int, bytes] = dict()
+        path = self._path
+        self._path = self._root_path()
+        self._scan_node(node, self._root[-1] if self._root else None, False)
+        self._path = path
+
+    def _use_block(self, node: yaml.Node, parent: Any, index: Any) -> Union[_BlockNode, None]:
+        subtree = self._subtrees.get(id(node))
+        if subtree is None or parent is None:
+            return None
+        if self._subtree_counts[subtree.digest] < 2:
+            return None
+        block = _BlockNode(yaml.resolver.BaseResolver.DEFAULT_SCALAR_TAG, "")
+        self.anchors[block] = None
+        marker_type = self._enter_node(block, index)
+        self._cache_node(marker_type, block)  # type: ignore
+        self._blocks[block.value] = (node, subtree, None)
+        return block
+
+    def _row_columns(self, node: yaml.MappingNode) -> Union[_Columns, None]:
+        # keys of a flat row rendered once for all rows with the same keys, None
+        # if one of them is not simple enough to be written without the emitter
+        shape = tuple((k.tag, k.value) for k, _ in node.value)
+        if shape in self._columns:
+            return self._columns[shape]
+        columns = None
+        keys = [self._simple_text(k, k.style) if type(k) is yaml.ScalarNode else None for k, _ in node.value]
+        if all(x is not None and len(x) < 128 and x[0] not in "'\"" for x in keys):
+            columns = _Columns(tuple(str(k.value) for k, _ in node.value), tuple(x + ":" for x in keys))  # type: ignore
+        if len(self._columns) < 64:  # lists of rows with ever new keys are written node by node
+            self._columns[shape] = columns
+        return columns
+
+    def _simple_text(self, node: yaml.ScalarNode, style: Any) -> Union[str, None]:
+        # the text the emitter writes for a scalar of _SIMPLE characters, no
+        # tag is needed for it and it is never split, None for anything else
+        value = node.value
+        if not isinstance(value, str) or _SIMPLE.match(value) is None:
+            return None
+        if not style and self._resolve_scalar(value) == node.tag:
+            return value
+        if node.tag != _STR_TAG or style not in (None, "", SINGLE_QUOTE, DOUBLE_QUOTE):
+            return None
+        return (style or SINGLE_QUOTE) + value + (style or SINGLE_QUOTE)
+
+    def _resolve_scalar(self, value: str) -> str:
+        return super().resolve(yaml.ScalarNode, value, (True, False))
+
+    def _use_row(self, node: yaml.Node, index: Any) -> Union[_BlockNode, None]:
+        # a flat mapping in a block sequence, where no comment rule touches its
+        # scalars, is written in one piece: its lines are made from the keys
+        # rendered once per set of keys and the styled values, rules on the
+        # row itself are applied around it as for any collection
+        if self._flow_nodes or self.canonical or self.best_line_break != "\n":
+            return None
+        if not isinstance(index, int) or self.anchors.get(node) is not None or not node.value:
+            return None
+        columns = self._row_columns(node)
+        if columns is None:
+            return None
+
+        self._path[-1].index = index
+        row = self._repr_path()
+        view = self._view(self._path)
+
+        flow_style = node.flow_style
+        if len(self._rules.flow_style) > 0:
+            found = self._rules.flow_style.last(row, view=view)
+            if found is not _MISSING:
+                flow_style = found
+        if flow_style:
+            return None
+
+        rules = self._rules
+        comments = len(rules.before) > 0 or len(rules.after) > 0
+        lines = list()
+        for (key, value), name, text in zip(node.value, columns.names, columns.keys):
+            if type(value) is not yaml.ScalarNode or self.anchors.get(value) is not None:
+                return None
+            if self.anchors.get(key) is not None:
+                return None
+            style = value.style
+            if comments or len(rules.style) > 0:
+                path = row + self._delim + name
+                if view is not None:
+                    view = _PathView.of((*self._path, _Mapping(key.value)))
+                if comments and (rules.before.matches(path, view) or rules.after.matches(path, view)):
+                    return None
+                found = rules.style.last(path, view=view) if len(rules.style) > 0 else _MISSING
+                if found is not _MISSING:
+                    style = found
+            value_text = self._simple_text(value, style)
+            if value_text is None:
+                return None
+            lines.append(text + " " + value_text)
+
+        block = _BlockNode(yaml.resolver.BaseResolver.DEFAULT_SCALAR_TAG, "")
+        self.anchors[block] = None
+        marker_type = self._enter_node(block, index)
+        self._cache_node(marker_type, block)  # type: ignore
+        first = row + self._delim + columns.names[0]
+        last = row + self._delim + columns.names[-1]
+        self._blocks[block.value] = (node, _Subtree(b"", first, last), lines)
+        return block
+
+    def _dedupe_node(
+        self, node: yaml.Node, index: Any, seen: Dict[Any, Any], done: Dict[int, Any]
+    ) -> Tuple[yaml.Node, Any, bool]:
+        # returns the first structurally equal node, a key of its structure and
+        # if no rule touches anything inside node, with the same path bookkeeping
+        # as serialize_node: subtrees that rules touch are written as they are
+        marker_type = self._enter_node(node, index)
+        if isinstance(node, yaml.ScalarNode):
+            clean = True
+            if marker_type is not None:
+                path = self._repr_path()
+                view = self._view(self._path)
+                if self._rules.before.matches(path, view) or self._rules.after.matches(path, view):
+                    clean = False
+                if index is not None and self._rules.style.matches(path, view):
+                    clean = False
+            self._leave_node(node, index)
+            # by type too: an inline array is written as flow text, a str with the same text is quoted
+            return node, (type(node), node.tag, node.value, node.style), clean
+        if id(node) in done:
+            self._leave_node(node, index)
+            return done[id(node)]
+
+        # comments around the node itself are written around its alias too, a flow style is not
+        own_path = self._delim.join(str(x) for x in self._path[:-1])
+        view = self._view(self._path[:-1])
+        mergeable = self._rules.flow_style.last(own_path, view=view) is _MISSING
+        touched = self._rules.before.matches(own_path, view) or self._rules.after.matches(own_path, view)
+
+        original = id(node)
+        done[original] = (node, ("recursive", original), False)
+        if isinstance(node, yaml.SequenceNode):
+            items = [self._dedupe_node(x, i, seen, done) for i, x in enumerate(node.value)]
+            node.value = [x for x, _, _ in items]
+            key = ("seq", node.tag, node.flow_style, tuple(x for _, x, _ in items))
+            clean = all(x for _, _, x in items)
+        else:
+            pairs = [(self._dedupe_node(k, None, seen, done), self._dedupe_node(v, k, seen, done)) for k, v in node.value]
+            node.value = [(k, v) for (k, _, _), (v, _, _) in pairs]
+            key = ("map", node.tag, node.flow_style, tuple((k, v) for (_, k, _), (_, v, _) in pairs))
+            clean = all(k and v for (_, _, k), (_, _, v) in pairs)
+        self._leave_node(node, index)
+
+        # small ids instead of nested keys, so that hashing stays linear
+        key_id = seen.setdefault(key, len(seen))
+        if clean and mergeable and len(node.value) > 0:
+            node = seen.setdefault(("node", key_id), node)
+        done[original] = (node, key_id, clean and mergeable and not touched)
+        return done[original]
+
+    def serialize(self, node: yaml.Node) -> None:
+        if self._dedupe:
+            path = self._path
+            self._path = self._root_path()
+            node, _, _ = self._dedupe_node(node, self._root[-1] if self._root else None, dict(), dict())
+            self._path = path
+        super().serialize(node)
+        self._process_remaining_hooks()
+
+    def _serialize_alias(self, node: yaml.Node, parent: Any, index: Any) -> None:
+        # remember the path of the alias, so that comments can be written around it
+        self._enter_node(node, index)
+        marker = None
+        path = self._path if isinstance(node, yaml.ScalarNode) else self._path[:-1]
+        if index is not None and len(path) > 0:
+            if isinstance(path[-1], _Sequence):
+                marker = f"{self._replace_marker_item}:{self._delim.join(str(x) for x in path)}"
+            else:
+                marker = f"{self._replace_marker_value}:{self._delim.join(str(x) for x in path)}"
+            self._cache[marker] = ""
+        self._aliases.append(marker)
+        super().serialize_node(node, parent, index)
+        self._leave_node(node, index)
+
+    def serialize_node(self, node, parent, index):
+        if node in self.serialized_nodes:
+            return self._serialize_alias(node, parent, index)
+
+        if parent is None:
+            if self._root:
+                index = self._root[-1]  # the root is a value or an item there
+            self._has_anchors = any(x is not None for x in self.anchors.values())
+            if self._first_index is not None and isinstance(node, yaml.SequenceNode):
+                node.flow_style = False
+            if self._render_cache is not None:
+                self._scan_document(node)
+
+        block = self._use_block(node, parent, index) if self._subtrees else None
+        if block is None and type(node) is yaml.MappingNode and isinstance(parent, yaml.SequenceNode):
+            block = self._use_row(node, index)
+        if block is not None:
+            # the path is left as a collection would leave it
+            return super().serialize_node(block, parent, index)
+
+        if index is not None and not node.value and type(node) in (yaml.SequenceNode, yaml.MappingNode):
+            # written like a scalar, so that hooks see empty collections too
+            if self.anchors.get(node) is None and node.tag in _EMPTY:
+                node = _InlineNode("tag:yaml.org,2002:str", _EMPTY[node.tag])
+                self.anchors[node] = None
+
+        marker_type = self._enter_node(node, index)
+
+        continued = parent is None and self._first_index is not None
+        if isinstance(node, yaml.SequenceNode) or isinstance(node, yaml.MappingNode):
+            if len(self._rules.flow_style) > 0 and not continued:
+                own_path = self._delim.join(str(x) for x in self._path[:-1])
+                flow_style = self._rules.flow_style.last(own_path, view=self._view(self._path[:-1]))
+                if flow_style is not _MISSING:
+                    node.flow_style = flow_style
         if marker_type is not None:
-            from_cache = self._cache[scalar]
+            self._cache_node(marker_type, node)
+            if marker_type == self._replace_marker_key and len(self._path) == 1:
+                if self._delim not in self._repr_path():  # would look like a nested path
+                    self._top_keys.add(node.value)
+
+        if isinstance(node, _InlineNode):
+            self._inline.add(node.value)
+        elif isinstance(node, yaml.ScalarNode) and index is not None:
+            if len(self._rules.style) > 0:
+                path = self._repr_path()
+                style = self._rules.style.last(path, view=self._view(self._path))
+                if style is not _MISSING:
+                    node.style = style
+
+        flow = isinstance(node, (yaml.SequenceNode, yaml.MappingNode)) and bool(node.flow_style)
+        self._flow_nodes += flow
+        super().serialize_node(node, parent, index)
+        self._flow_nodes -= flow
+
+        self._leave_node(node, index)
+
+    def represent_array(self, data: Any) -> yaml.Node:
+        if not is_numeric_array(data):
+            return self.represent_object(data)
+        return _InlineNode("tag:yaml.org,2002:str", format_array(data))
+
+    def analyze_scalar(self, scalar: str):
+        if scalar in self._inline or scalar in self._blocks:
+            # rendered flow sequence, must be written plain
+            return yaml.emitter.ScalarAnalysis(
+                scalar=scalar,
+                empty=False,
+                multiline=False,
+                allow_flow_plain=True,
+                allow_block_plain=True,
+                allow_single_quoted=False,
+                allow_double_quoted=False,
+                allow_block=False,
+            )
+        from_cache = self._cache.get(scalar)  # markers only, a dict lookup is cheaper than parsing them
+        if from_cache is not None:
             result = super().analyze_scalar(from_cache)
             result.scalar = scalar
             return result
         return super().analyze_scalar(scalar)
 
     def resolve(self, kind, value, implicit):
+        if kind is yaml.ScalarNode and value in self._blocks:
+            return yaml.resolver.BaseResolver.DEFAULT_SCALAR_TAG
         if kind is yaml.ScalarNode:
-            marker_type, _ = self._extract_marker(value)
-            if marker_type is not None:
-                from_cache = self._cache[value]
+            from_cache = self._cache.get(value)
+            if from_cache is not None:
                 return super().resolve(kind, from_cache, implicit)
         return super().resolve(kind, value, implicit)
 
     def _get_level(self, a: str) -> int:
         return a.count(self._delim)
 
-    def _check_same_level(self, a: str, b: str) -> bool:
-        return self._get_level(a) == self._get_level(b)
-
-    def _get_path_prev_level(self, path: str) -> str:
-        tokens = path.split(self._delim)
-        tokens = tokens[:-1]
-        return self._delim.join(tokens)
-
-    def _my_get_indent(self, path: str) -> int:
-        if path in self._indent_cache:
-            return self._indent_cache[path]
-        return 0
-
-    def represent(self, *args, **kwargs) -> None:
-        super().represent(*args, **kwargs)
-        if self._last_hooked_after is not None:
-            rem_levels = self._get_level(self._last_hooked_after)
-            if rem_levels > 0:
-                for _ in range(rem_levels + 1):
-                    shift = self._my_get_indent(self._last_hooked_after)
-                    self.indents = [shift]
-                    self._process_hook_after(self._last_hooked_after)
-                    self._last_hooked_after = self._get_path_prev_level(
-                        self._last_hooked_after
-                    )
-                self.indents = []
+    def _ended_paths(self, path: Union[str, None]) -> List[str]:
+        # collections closed between the last hooked scalar and path, innermost first
+        last = self._last_hooked_after.split(self._delim)  # type: ignore
+        tokens = path.split(self._delim) if path is not None else []
+        common = 0
+        for a, b in zip(last, tokens):
+            if a != b:
+                break
+            common += 1
+        end = len(last) if self._last_hooked_key else len(last) - 1
+        end = min(end, len(last) - self._last_flow_level)  # no comments inside flow collections
+        found = [self._delim.join(last[:x]) for x in range(end, max(common, len(self._root)), -1)]
+        return [
+            x
+            for x in found
+            if x not in self._after_hook_cache and self._rules.after.matches(x, hits=self._after_hits.get(x, ()))
+        ]
+
+    def _process_ended_hooks(self, ended: List[str]) -> None:
+        copy_indents = list(self.indents)
+        for path in ended:
+            level = self._get_level(path) - len(self._root)
+            indent = self._indent_cache.get(path, level * self.best_indent)
+            self.indents = [*copy_indents, indent]
+            self._process_hook_after(path)
+        self.indents = copy_indents
+
+    def _process_remaining_hooks(self) -> None:
+        # after comments of all levels still open at the document end
+        if self._last_hooked_after is not None and self._comments:
+            self._process_ended_hooks(self._ended_paths(None))
+            self._last_hooked_after = None
 
     def _hook_processor(self, inner: Callable, text: str, *args, **kwargs) -> Any:
         marker_type, path = self._extract_marker(text)
-
-        if self._last_hooked_after is not None:
-            level_last = self._get_level(self._last_hooked_after)
-            level_current = self._get_level(path)
-            if level_current < level_last:
-                prev_level = self._get_path_prev_level(self._last_hooked_after)
-                copy_indents = copy.deepcopy(self.indents)
-                last_indent = (level_last - 1) * self.best_indent
-                self.indents = [*self.indents, last_indent]
-                self._process_hook_after(prev_level)
-                self._last_hooked_after = prev_level
-                self.indents = copy_indents
-
-        if self._last_hooked_before is not None:
-            level_last = self._get_level(self._last_hooked_before)
-            level_current = self._get_level(path)
-            if level_current > level_last + 1:
-                prev_level = self._get_path_prev_level(path)
-                copy_indents = copy.deepcopy(self.indents)
-                self.indents = self.indents[:-2]
-                copy_column = self.column
-                self.column = copy_indents[-2]
-                self._process_hook_before(prev_level, missing=True)
-                self._last_hooked_before = prev_level
-                self.indents = copy_indents
-                self.column = copy_column
+        self._process_pending_hooks(path, marker_type == self._replace_marker_item)
+        if text in self._top_keys:
+            self._offsets.append(self.stream.tell())  # type: ignore
 
         if marker_type is not None:
-            text = self._cache[text]
+            text = self._cache.pop(text)  # written once, large values are not kept to the end
             self._last_hooked_before = path
-            if marker_type == self._replace_marker_key:
-                self._process_hook_before(path)
-            elif marker_type == self._replace_marker_item:
+            if marker_type == self._replace_marker_key and not self.flow_level and self._comments:
                 self._process_hook_before(path)
 
         inner_out = inner(text, *args, **kwargs)
 
         if marker_type is not None:
             self._last_hooked_after = path
-            if marker_type == self._replace_marker_value:
-                self._process_hook_after(path)
-            elif marker_type == self._replace_marker_item:
-                self._process_hook_after(path)
+            self._last_hooked_key = marker_type == self._replace_marker_key
+            self._last_flow_level = self.flow_level
+            if marker_type != self._replace_marker_key and not self.flow_level and self._comments:
+                if not self._is_root(path):
+                    self._process_hook_after(path)
 
         return inner_out
 
+    def _process_pending_hooks(self, path: str, item: bool = False) -> None:
+        # comments of levels left or skipped on the way to path
+        if not self._comments:
+            return
+        if self._last_hooked_after is not None:
+            ended = self._ended_paths(path)
+            if ended:
+                # the emitter has already started the line of path, comments go above it
+                line = self.stream.cut_line()  # type: ignore
+                state = (self.column, self.whitespace, self.indention)
+                self._process_ended_hooks(ended)
+                self.stream.write(line)
+                self.column, self.whitespace, self.indention = state
+
+        # sequence items started since the last hook, their dashes are on the current line
+        items = self._started_items(path, item)
+        if items:
+            self._process_items_before(items)
+
+    def write_stream_end(self) -> None:
+        # all hooks are done, write the text out now, not when the dumper is collected
+        self.stream.close()
+        super().write_stream_end()
+
+    def _write_alias(self, text: str) -> None:
+        super().expect_alias()
+
+    def expect_alias(self):
+        marker = self._aliases.popleft() if len(self._aliases) > 0 else None
+        if marker is None:
+            return super().expect_alias()
+        # indentation as for a scalar at the same place, comments are aligned by it
+        self.increase_indent(flow=True)
+        self._hook_processor(self._write_alias, marker)
+        self.indent = self.indents.pop()
+
+    def _write_inline(self, text: str) -> None:
+        # same as write_plain without splitting, written in one call
+        if self.root_context:
+            self.open_ended = True
+        if not self.whitespace:
+            self.stream.write(" ")
+            self.column += 1
+        self.whitespace = False
+        self.indention = False
+        self.stream.write(text)
+        self.column += len(text)
+
+    def _render_block(self, node: yaml.Node, indent: int) -> Tuple[str, int, int, bool]:
+        stream = io.StringIO()
+        dumper = yaml.Dumper(stream, indent=self.best_indent, allow_unicode=self.allow_unicode)
+        dumper.best_width = self.best_width - indent  # split lines at the same columns
+        dumper.open()
+        dumper.serialize(node)
+        dumper.close()
+        dumper.dispose()
+
+        text = stream.getvalue()
+        open_ended = text.endswith("\n...\n")
+        if open_ended:
+            text = text[: -len("...\n")]
+        lines = text[:-1].split("\n")
+
+        pad = " " * indent
+        text = lines[0] + "".join("\n" + (pad + x if x else x) for x in lines[1:])
+        last = len(lines[-1]) + (indent if lines[-1] else 0)
+        return text, len(lines) - 1, last, open_ended
+
+    def _join_row(self, lines: List[str], indent: int) -> Tuple[str, int, int, bool]:
+        # same layout as _render_block gives for the row
+        text = ("\n" + " " * indent).join(lines)
+        last = len(lines[-1]) + (indent if len(lines) > 1 else 0)
+        return text, len(lines) - 1, last, False
+
+    def _write_block(self, marker: str) -> None:
+        node, subtree, row = self._blocks.pop(marker)  # written once, rows are not kept to the end
+        self._cache.pop(marker, None)
+
+        # hooks see the first and the last scalar like on a node by node walk
+        block_type, block_path = self._extract_marker(marker)
+        self._process_pending_hooks(block_path, block_type == self._replace_marker_item)
+        self._last_hooked_before = subtree.first
+        self._process_hook_before(subtree.first)
+
+        indent = self.indent or 0
+        if isinstance(node, yaml.SequenceNode) and self.mapping_context and not self.indention:
+            indent -= self.best_indent  # indentless sequence
+
+        if row is not None:
+            entry = self._join_row(row, indent)
+        else:
+            key = (subtree.digest, indent, self.best_indent, self.best_width, self.allow_unicode)
+            entry = self._render_cache.get(key)  # type: ignore
+            if entry is None:
+                entry = self._render_block(node, indent)
+                self._render_cache.put(key, entry)  # type: ignore
+        text, lines, last, open_ended = entry
+
+        current_indent = self.indent
+        self.indent = indent
+        self.write_indent()
+        self.indent = current_indent
+
+        self.stream.write(text)
+        self.line += lines
+        self.column = last if lines > 0 else self.column + last
+        self.whitespace = lines > 0 and last == 0
+        self.indention = self.whitespace
+        if open_ended:
+            self.open_ended = True
+
+        self._last_hooked_after = subtree.last
+        self._last_hooked_key = False
+        self._last_flow_level = self.flow_level
+        self._last_hooked_before = subtree.last
+
     def write_plain(self, text, split=True):
+        if text in self._blocks:
+            return self._write_block(text)
+        if text in self._inline:
+            return self._hook_processor(self._write_inline, text)
         return self._hook_processor(super().write_plain, text, split)
 
     def write_folded(self, text):
@@ -334,42 +1047,69 @@ class _Dumper(yaml.Dumper):
     def write_double_quoted(self, text, split=True):
         return self._hook_processor(super().write_double_quoted, text, split)
 
-    def _process_hook_before(self, path: str, missing: bool = False) -> None:
-        if path in self._before_hook_cache:
+    def _process_hook_before(self, path: str) -> None:
+        # the path of a mapping key, items are done by _process_items_before
+        if (path, False) in self._before_hook_cache:
             return
 
-        self._before_hook_cache.add(path)
+        self._before_hook_cache.add((path, False))
         self._indent_cache[path] = self.column
 
-        for rule, data in self._before.items():
-            if re.search(rule, path):
-                cur_indent = self.column
+        for data in self._rules.before.values(path, hits=self._before_hits.pop((path, False), ())):
+            cur_indent = self.column
+            lines = data.split("\n")
+            lines = [" " * cur_indent + x for x in lines]
+            lines[0] = lines[0].lstrip()
 
-                if self._is_last_sequence(path) and not missing:
-                    self.stream.seek_prev_line()  # type: ignore
-                    self.stream.write(" " * self.indents[-1])
-                    cur_indent = self.indents[-1]
-                elif self._is_last_sequence(path) and missing:
-                    self.stream.seek_prev_line()  # type: ignore
-                    self.stream.write(" " * self.indents[-1])
+            for line in lines:
+                self.stream.write(line + "\n")
+                self.line += 1
+            self.stream.write(" " * cur_indent)
 
+    def _started_items(self, path: str, item: bool) -> List[str]:
+        # sequence items opened after the last hooked path up to path, outermost first
+        last = self._last_hooked_before.split(self._delim) if self._last_hooked_before is not None else []
+        tokens = path.split(self._delim)
+        common = 0
+        for a, b in zip(last, tokens):
+            if a != b:
+                break
+            common += 1
+        end = len(tokens) if item else len(tokens) - 1
+        end = min(end, len(tokens) - self.flow_level)
+        found = [self._delim.join(tokens[:x]) for x in range(max(common, len(self._root)) + 1, end + 1)]
+        return [x for x in found if (x, True) not in self._before_hook_cache and self._is_last_sequence(x)]
+
+    def _process_items_before(self, items: List[str]) -> None:
+        # the emitter has written the dashes of the items already, the line is
+        # taken back and written again with the comments in front of the dashes:
+        # above the line for the first dash, right after the outer dash for others
+        line = self.stream.cut_line()  # type: ignore
+        dashes = [i for i, x in enumerate(line) if x == "-" and line[i + 1 : i + 2] in (" ", "")]
+        if len(dashes) < len(items):
+            # an anchor or a tag moved the collection to the next line
+            first = dashes[0] if dashes else len(line) - len(line.lstrip(" "))
+            dashes = [first] * (len(items) - len(dashes)) + dashes
+        dashes = dashes[len(dashes) - len(items) :]
+
+        out = list()
+        head = ""
+        done = 0
+        for path, dash in zip(items, dashes):
+            self._before_hook_cache.add((path, True))
+            self._indent_cache[path] = dash
+            for data in self._rules.before.values(path, hits=self._before_hits.pop((path, True), ())):
                 lines = data.split("\n")
-                lines = [" " * cur_indent + x for x in lines]
-                lines[0] = lines[0].lstrip()
-
-                for line in lines:
-                    self.stream.write(line + "\n")
-                    self.line += 1
-
-                if self._is_last_sequence(path) and not missing:
-                    self.stream.write(" " * max(0, self.column - 1))
-                    self.stream.write("-")
-                elif self._is_last_sequence(path) and missing:
-                    self.stream.write(" " * max(0, self.column))
-                    self.stream.write("-")
-                    self.stream.write(" " * max(0, self.best_indent - 1))
-                else:
-                    self.stream.write(" " * cur_indent)
+                self.line += len(lines)
+                head += line[done:dash]
+                done = max(done, dash)
+                if head.strip():
+                    out.append(head + lines.pop(0) + "\n")
+                    head = " " * dash
+                out.extend(" " * dash + x + "\n" for x in lines)
+
+        out.append(head + line[done:])
+        self.stream.write("".join(out))
 
     def _process_hook_after(self, path: str) -> None:
         if path in self._after_hook_cache:
@@ -377,24 +1117,26 @@ class _Dumper(yaml.Dumper):
 
         self._after_hook_cache.add(path)
 
-        for rule, data in self._after.items():
-            if re.search(rule, path):
-                cur_indent = self.indents[-1]
-                lines = data.split("\n")
-                lines = [" " * cur_indent + x for x in lines]
-                lines = [x.rstrip() for x in lines]
+        for data in self._rules.after.values(path, hits=self._after_hits.pop(path, ())):
+            cur_indent = self.indents[-1]
+            lines = data.split("\n")
+            lines = [" " * cur_indent + x for x in lines]
+            lines = [x.rstrip() for x in lines]
+
+            if self.stream.lastchar() != "\n":  # type: ignore
+                self.stream.write("\n")
+                self.line += 1
 
-                if self.stream.lastchar() != "\n":  # type: ignore
-                    self.stream.write("\n")
-                    self.line += 1
+            for line in lines:
+                self.stream.write(line + "\n")
+                self.line += 1
 
-                for line in lines:
-                    self.stream.write(line + "\n")
-                    self.line += 1
+            self.column = 0
+            self.whitespace = True
+            self.indention = True
 
-                self.column = 0
-                self.whitespace = True
-                self.indention = True
+
+_Dumper.add_representer(array.array, _Dumper.represent_array)
 
 
 def create_dumper(
@@ -403,12 +1145,31 @@ def create_dumper(
     after: Union[Dict[str, Any], None] = None,
     flow_style: Union[Dict[str, Any], None] = None,
     delimiter: str = "/",
+    render_cache: Union["RenderCache", None] = None,
+    dedupe: bool = False,
+    rules_cache: Union[str, None] = None,
+    chunk_size: int = 1 << 20,
+    max_buffer: Union[int, None] = 1 << 22,
 ) -> Type[_Dumper]:
+    # rules are compiled once here and shared by every dump made with this dumper,
+    # rules_cache is a directory to keep compiled rules in between runs
+    rules = _load_rules(style, before, after, flow_style, delimiter, rules_cache)
     return functools.partial(
         _Dumper,
-        style=style,
-        after=after,
-        before=before,
-        flow_style=flow_style,
+        rules=rules,
         delimiter=delimiter,
+        render_cache=render_cache,
+        dedupe=dedupe,
+        chunk_size=chunk_size,
+        max_buffer=max_buffer,
     )  # type: ignore
+
+
+def dumps_bytes(data: Any, Dumper: Union[Type[_Dumper], None] = None, encoding: str = "utf-8", **kwds) -> bytearray:
+    """
+    Dump data to an encoded bytearray. The text is encoded chunk by chunk
+    straight into the returned buffer, no copy of the whole document is made.
+    """
+    buffer = bytearray()
+    yaml.dump(data, buffer, Dumper or create_dumper(), encoding=encoding, **kwds)
+    return buffer
@@ -0,0 +1,190 @@
+import io
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Tuple, Type
+
+import yaml
+
+from .hook_dumper import _Dumper
+
+
+@dataclass
+class DumpIndex:
+    """
+    Start offsets of the top-level entries of a dumped document, followed by
+    the length of the text. Empty if the document can not be spliced (not a
+    block mapping at the top, or it has anchors or dedupe is on).
+
+    Offsets are str indexes, ints only, so the index is easy to save as json.
+    """
+
+    offsets: List[int] = field(default_factory=list)
+    rendered: int = 0  # top-level entries rendered to produce the text
+
+
+def _same(a: Any, b: Any) -> bool:
+    # equality that also tells 1, 1.0 and True apart, they are dumped differently
+    if a is b:
+        return True
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        if len(a) != len(b):
+            return False
+        return all(
+            _same(ka, kb) and _same(va, vb)
+            for (ka, va), (kb, vb) in zip(a.items(), b.items())
+        )
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    try:
+        return bool(a == b)
+    except Exception:
+        return False
+
+
+def _shared(data: Any) -> bool:
+    # if some object is in data more than once, a full dump writes it as an anchor and aliases,
+    # the objects the representer never aliases are skipped like in SafeRepresenter.ignore_aliases
+    seen = set()
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if item is None or isinstance(item, (str, bytes, bool, int, float)) or item == ():
+            continue
+        if id(item) in seen:
+            return True
+        seen.add(id(item))
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+    return False
+
+
+def _key_order(data: Dict[Any, Any], sort_keys: bool) -> List[Any]:
+    # same order as SafeRepresenter.represent_mapping writes the keys in
+    items = list(data.items())
+    if sort_keys:
+        try:
+            items = sorted(items)
+        except TypeError:
+            pass
+    return [k for k, _ in items]
+
+
+def _run(Dumper: Type[_Dumper], kwds: Dict[str, Any], write: Callable[[_Dumper], None]) -> Tuple[str, _Dumper]:
+    stream = io.StringIO()
+    dumper = Dumper(stream, **kwds)
+    try:
+        dumper.open()
+        write(dumper)
+        dumper.close()
+    finally:
+        dumper.dispose()
+    return stream.getvalue(), dumper
+
+
+def _splittable(text: str, dumper: _Dumper, count: int) -> bool:
+    offsets = dumper._offsets
+    if dumper._dedupe or dumper._has_anchors:
+        return False  # aliases may point into other entries
+    if dumper.default_flow_style is not False:
+        return False  # the top-level style would depend on the entries
+    if count == 0 or len(offsets) != count:
+        return False
+    return all(x == 0 or text[x - 1] == "\n" for x in offsets)
+
+
+def dump_indexed(data: Any, Dumper: Type[_Dumper], **kwds) -> Tuple[str, DumpIndex]:
+    """
+    Dump data like yaml.dump(data, Dumper=Dumper, **kwds) and return the text
+    together with the index needed by redump().
+    """
+    text, dumper = _run(Dumper, kwds, lambda x: x.represent(data))
+    count = len(data) if type(data) is dict else 0
+    if not _splittable(text, dumper, count):
+        return text, DumpIndex(rendered=1)
+    return text, DumpIndex([*dumper._offsets, len(text)], rendered=count)
+
+
+def _render_entries(
+    Dumper: Type[_Dumper], kwds: Dict[str, Any], data: Dict[Any, Any], keys: List[Any], last: bool
+) -> Tuple[str, List[int], bool]:
+    # renders only given top-level entries, one more empty entry is added after
+    # them unless they end the document, so that they end like in the full dump
+    def write(dumper: _Dumper) -> None:
+        pairs = [(dumper.represent_data(k), dumper.represent_data(data[k])) for k in keys]
+        if not last:
+            pairs.append(
+                (
+                    yaml.ScalarNode(yaml.resolver.BaseResolver.DEFAULT_SCALAR_TAG, "end"),
+                    yaml.ScalarNode("tag:yaml.org,2002:null", ""),
+                )
+            )
+        dumper.serialize(
+            yaml.MappingNode(yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG, pairs, flow_style=False)
+        )
+
+    text, dumper = _run(Dumper, kwds, write)
+    ok = _splittable(text, dumper, len(keys) + (0 if last else 1))
+    return text, [*dumper._offsets, len(text)][: len(keys) + 1], ok
+
+
+def redump(
+    old_data: Any,
+    new_data: Any,
+    old_text: str,
+    index: DumpIndex,
+    Dumper: Type[_Dumper],
+    **kwds,
+) -> Tuple[str, DumpIndex]:
+    """
+    Dump new_data reusing the text of the top-level entries of old_text that
+    did not change since old_data was dumped with the same Dumper and kwds.
+    Only changed entries are rendered, all at once, and spliced in.
+
+    The result is the same as a full dump. It falls back to one if the text
+    can not be spliced or an object is in new_data more than once, which a
+    full dump writes as an anchor and aliases.
+    """
+    if not index.offsets or type(new_data) is not dict or len(new_data) == 0 or _shared(new_data):
+        return dump_indexed(new_data, Dumper, **kwds)
+
+    sort_keys = kwds.get("sort_keys", True)
+    old_keys = _key_order(old_data, sort_keys)
+    new_keys = _key_order(new_data, sort_keys)
+    if len(old_keys) + 1 != len(index.offsets):
+        raise ValueError("index does not match the previous data")
+
+    old_positions = {k: i for i, k in enumerate(old_keys)}
+    segments: List[Any] = list()
+    changed: List[Any] = list()
+
+    for position, key in enumerate(new_keys):
+        i = old_positions.get(key)
+        same = (
+            i is not None
+            and (i == len(old_keys) - 1) == (position == len(new_keys) - 1)
+            and _same(old_keys[i], key)
+            and _same(old_data[old_keys[i]], new_data[key])
+        )
+        if same:
+            segments.append(old_text[index.offsets[i] : index.offsets[i + 1]])
+        else:
+            segments.append(None)
+            changed.append(key)
+
+    if changed:
+        last = segments[-1] is None
+        text, offsets, ok = _render_entries(Dumper, kwds, new_data, changed, last)
+        if not ok:
+            return dump_indexed(new_data, Dumper, **kwds)
+        rendered = iter(text[offsets[j] : offsets[j + 1]] for j in range(len(changed)))
+        segments = [x if x is not None else next(rendered) for x in segments]
+
+    head = old_text[: index.offsets[0]]
+    new_offsets = [len(head)]
+    for segment in segments:
+        new_offsets.append(new_offsets[-1] + len(segment))
+    return head + "".join(segments), DumpIndex(new_offsets, rendered=len(changed))
@@ -0,0 +1,186 @@
+import io
+import sys
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Tuple, Type, Union
+
+import yaml
+
+from .hook_dumper import _Dumper, create_dumper
+
+
+@dataclass
+class PhaseMemory:
+    """Memory traced during one phase, relative to its start, in bytes."""
+
+    peak: int = 0
+    retained: int = 0  # still allocated when the phase ended
+
+
+@dataclass
+class MemoryReport:
+    """
+    Peak memory of one dump, by phase (from tracemalloc) and by structure
+    (sized directly, tracked during the dump where a structure shrinks):
+
+    nodes   node graph built by the representer
+    cache   most scalar texts kept by the dumper at once for hooks and
+            styles, each is dropped when it is written
+    hooks   before/after hook bookkeeping and the indent cache, these only
+            grow, so their size at the end is the peak
+    buffer  most text held by the stream wrapper at once, right before
+            complete lines are written out or at the end of the document
+
+    Structures share strings, so their sum can be more than the phase peaks.
+    """
+
+    phases: Dict[str, PhaseMemory] = field(default_factory=dict)
+    structures: Dict[str, int] = field(default_factory=dict)
+    output: int = 0  # length of the written document in characters
+
+    @property
+    def peak(self) -> int:
+        return max((x.peak for x in self.phases.values()), default=0)
+
+    def format(self) -> str:
+        lines = [f"{'phase':<12}{'peak':>12}{'retained':>12}"]
+        for name, phase in self.phases.items():
+            lines.append(f"{name:<12}{_mb(phase.peak):>12}{_mb(phase.retained):>12}")
+        lines.append(f"{'structure':<12}{'peak':>12}")
+        for name, size in self.structures.items():
+            lines.append(f"{name:<12}{_mb(size):>12}")
+        return "\n".join(lines)
+
+
+def _mb(size: int) -> str:
+    return f"{size / 1e6:.2f} MB"
+
+
+def _deep_size(*roots: Any) -> int:
+    # sys.getsizeof of everything reachable, objects shared inside are counted once
+    seen = set()
+    stack = list(roots)
+    size = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif isinstance(obj, yaml.Node):
+            stack.append(vars(obj))
+    return size
+
+
+class _SizedDict(dict):
+    # the dumper's scalar cache, with the sizes of its entries and the largest total
+    def __init__(self):
+        super().__init__()
+        self.size = 0
+        self.peak = sys.getsizeof(self)
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        self.pop(key, None)
+        super().__setitem__(key, value)
+        self.size += sys.getsizeof(key) + sys.getsizeof(value)
+        self.peak = max(self.peak, self.size + sys.getsizeof(self))
+
+    def pop(self, key: Any, *default: Any) -> Any:
+        if key in self:
+            self.size -= sys.getsizeof(key) + sys.getsizeof(self[key])
+        return super().pop(key, *default)
+
+
+def _track_buffer(stream: Any) -> List[int]:
+    # the buffer is the largest right before its complete lines are written out
+    peak = [stream.buffer_size()]
+
+    def tracked(write_out: Callable[[], None]) -> Callable[[], None]:
+        def call() -> None:
+            peak[0] = max(peak[0], stream.buffer_size())
+            write_out()
+
+        return call
+
+    stream._spill = tracked(stream._spill)
+    stream._myflush = tracked(stream._myflush)
+    return peak
+
+
+class _Phases:
+    def __init__(self, report: MemoryReport):
+        self._report = report
+        self._start = 0
+
+    def start(self) -> None:
+        if hasattr(tracemalloc, "reset_peak"):  # python 3.9+, before that peaks add up
+            tracemalloc.reset_peak()
+        self._start = tracemalloc.get_traced_memory()[0]
+
+    def stop(self, name: str) -> None:
+        current, peak = tracemalloc.get_traced_memory()
+        self._report.phases[name] = PhaseMemory(max(0, peak - self._start), max(0, current - self._start))
+
+
+def dump_with_report(
+    data: Any,
+    stream: Any = None,
+    Dumper: Union[Type[_Dumper], None] = None,
+    **kwds,
+) -> Tuple[Any, MemoryReport]:
+    """
+    Dump data like yaml.dump(data, stream, Dumper, **kwds) and return the
+    result (the document if stream is None) together with a MemoryReport.
+
+    Tracing slows the dump down several times, use it to size machines and
+    find which structure grows, not in production dumps.
+    """
+    getvalue = stream is None
+    if stream is None:
+        stream = io.BytesIO() if kwds.get("encoding") is not None else io.StringIO()
+    dumper = (Dumper or create_dumper())(stream, **kwds)
+    dumper._cache = cache = _SizedDict()
+    buffer = _track_buffer(dumper.stream)
+    report = MemoryReport()
+    phases = _Phases(report)
+
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        dumper.open()
+
+        phases.start()
+        node = dumper.represent_data(data)
+        phases.stop("representer")
+        report.structures["nodes"] = _deep_size(node)
+
+        phases.start()
+        dumper.serialize(node)
+        phases.stop("serializer")
+        report.structures["cache"] = cache.peak
+        report.structures["hooks"] = _deep_size(
+            dumper._before_hook_cache, dumper._after_hook_cache, dumper._indent_cache
+        )
+        report.output = dumper.stream.tell()
+
+        del node
+        dumper.represented_objects = dict()
+        dumper.object_keeper = list()
+        dumper.alias_key = None
+
+        phases.start()
+        dumper.close()
+        phases.stop("flush")
+        report.structures["buffer"] = buffer[0]
+    finally:
+        dumper.dispose()
+        if not tracing:
+            tracemalloc.stop()
+
+    return (stream.getvalue() if getvalue else None), report
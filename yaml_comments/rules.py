@@ -0,0 +1,421 @@
+import re
+from typing import Any, Callable, Dict, Iterable, List, Tuple, Union
+
+
+# rule that is a plain literal with optional ^ and $ anchors,
+# possibly with escaped punctuation like "\." or "\/"
+_LITERAL_RULE = re.compile(r"(\^?)((?:[^\\.^$*+?{}\[\]|()]|\\[^A-Za-z0-9])*)(\$?)\Z")
+_ESCAPED_CHAR = re.compile(r"\\(.)")
+
+# constructs that break when patterns are joined into one alternation
+_UNCOMBINABLE = re.compile(r"\\[1-9]|\\g<|\(\?P=|\(\?\(")
+
+_MISSING = object()
+_BY_INDEX = object()  # memo entry of a predicate that reads sequence indexes
+_MEMO_SIZE = 1 << 14  # memo entries of a table before it starts over
+
+
+class _Wildcard:
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __repr__(self) -> str:
+        return self.name
+
+    def __reduce__(self) -> str:
+        return self.name  # the module global of that name, so it stays a singleton
+
+
+# template segments for any sequence item and any mapping key
+_ITEM = _Wildcard("_ITEM")
+_ANY_KEY = _Wildcard("_ANY_KEY")
+
+
+class _OtherKeys:
+    """
+    Template segment for the keys that are none of keys and match none of
+    patterns, like "additionalProperties" next to "properties" in a JSON
+    Schema. It is looked up like a compiled pattern for keys.
+    """
+
+    __slots__ = ("keys", "patterns")
+
+    def __init__(self, keys: Iterable[str], patterns: Iterable[Any]):
+        self.keys = frozenset(keys)
+        self.patterns = tuple(patterns)
+
+    def search(self, key: str) -> Union[bool, None]:
+        if key in self.keys or any(x.search(key) is not None for x in self.patterns):
+            return None
+        return True
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, _OtherKeys):
+            return NotImplemented
+        return self.keys == other.keys and self.patterns == other.patterns
+
+    def __hash__(self) -> int:
+        return hash((self.keys, self.patterns))
+
+    def __repr__(self) -> str:
+        # sorted, the repr is part of the rules_cache digest
+        return f"_OtherKeys({sorted(self.keys)!r}, {list(self.patterns)!r})"
+
+    def __getstate__(self) -> Tuple[Any, ...]:
+        return self.keys, self.patterns
+
+    def __setstate__(self, state: Tuple[Any, ...]) -> None:
+        self.keys, self.patterns = state
+
+
+class _Template(tuple):
+    """
+    Rule matching whole structured paths: mapping keys (str), compiled
+    patterns for keys, _OtherKeys, _ITEM and _ANY_KEY, see schema.py.
+    """
+
+    def __repr__(self) -> str:
+        return f"_Template({tuple(self)!r})"
+
+
+class _TemplateNode:
+    __slots__ = ("keys", "patterns", "indices")
+
+    def __init__(self):
+        self.keys: Dict[Any, "_TemplateNode"] = dict()  # str keys, _ITEM and _ANY_KEY
+        self.patterns: List[Tuple[Any, "_TemplateNode"]] = list()
+        self.indices: List[int] = list()
+
+    def add(self, template: _Template, index: int) -> None:
+        node = self
+        for segment in template:
+            if isinstance(segment, (str, _Wildcard)):
+                node = node.keys.setdefault(segment, _TemplateNode())
+            else:
+                child = next((x for p, x in node.patterns if p == segment), None)
+                if child is None:
+                    child = _TemplateNode()
+                    node.patterns.append((segment, child))
+                node = child
+        node.indices.append(index)
+
+    def find(self, shape: Tuple[Any, ...]) -> List[int]:
+        # shape has the key of mapping segments and None for sequence items
+        level = [self]
+        for key in shape:
+            found = list()
+            for node in level:
+                if key is None:
+                    found.append(node.keys.get(_ITEM))
+                    continue
+                found.append(node.keys.get(key))
+                found.append(node.keys.get(_ANY_KEY))
+                found.extend(x for p, x in node.patterns if p.search(key) is not None)
+            level = [x for x in found if x is not None]
+            if not level:
+                return []
+        return [i for x in level for i in x.indices]
+
+# bump when _RuleTable changes, cached tables of other versions are rebuilt
+_CACHE_FORMAT = 2
+
+
+def _split_literal(rule: str) -> Union[Tuple[bool, str, bool], None]:
+    found = _LITERAL_RULE.match(rule)
+    if found is None:
+        return None
+    begin, body, end = found.groups()
+    return bool(begin), _ESCAPED_CHAR.sub(r"\1", body), bool(end)
+
+
+class _RuleTable:
+    """
+    Rules compiled once for fast lookup of a path.
+
+    Literal rules (the usual "^a/b/c$" case) go to dict and str.startswith /
+    str.endswith indexes, everything else is checked with one combined
+    regex first, so paths that are not matched by any rule cost a few
+    C-level calls instead of a python loop over the whole table.
+
+    A rule may also be a callable, a predicate on the structured path (see
+    _PathView in hook_dumper.py). Its results are memoized per path shape,
+    so it runs once for all items of a sequence, unless it reads a sequence
+    index: then it runs for every path like a regex. _Template rules go to
+    a trie walked once per path shape.
+
+    A table does not change once it is built, lookups may run in many
+    threads at once. The only late writes are compiling the single patterns
+    of an unpickled table and the memo of predicate and template results,
+    which give the same result in every thread. The memo is shared by all
+    dumps, it starts over once it holds _MEMO_SIZE shapes, so paths with
+    ever new keys like ids do not grow it without end.
+    """
+
+    def __init__(self, rules: Union[Dict[Any, Any], None], anchored: bool):
+        self._anchored = anchored
+        values: List[Any] = list()
+
+        self._exact: Dict[str, List[int]] = dict()
+        self._prefix: List[Tuple[str, int]] = list()
+        self._suffix: List[Tuple[str, int]] = list()
+        self._contains: List[Tuple[str, int]] = list()
+        self._regex: List[Tuple[Any, int]] = list()
+        self._loose: List[Tuple[Any, int]] = list()
+        self._combined = None
+        self._regex_ready = True
+        self.predicates: List[Tuple[Callable[..., Any], int]] = list()
+        self._templates: Union[_TemplateNode, None] = None
+        self._memo: Dict[Any, Any] = dict()
+
+        # the caller's dict is read once here, changing it later has no effect
+        for index, (rule, value) in enumerate(list((rules or dict()).items())):
+            values.append(value)
+            if callable(rule):
+                self.predicates.append((rule, index))
+                continue
+            if isinstance(rule, _Template):
+                self._templates = self._templates or _TemplateNode()
+                self._templates.add(rule, index)
+                continue
+            literal = _split_literal(rule)
+
+            if literal is None:
+                if _UNCOMBINABLE.search(rule) is None:
+                    self._regex.append((re.compile(rule), index))
+                else:
+                    self._loose.append((re.compile(rule), index))
+                continue
+
+            begin, body, end = literal
+            begin = begin or anchored
+
+            if begin and end:
+                # "$" also matches right before a trailing newline
+                self._exact.setdefault(body, list()).append(index)
+                self._exact.setdefault(body + "\n", list()).append(index)
+            elif begin:
+                self._prefix.append((body, index))
+            elif end:
+                self._suffix.append((body, index))
+                self._suffix.append((body + "\n", index))
+            else:
+                self._contains.append((body, index))
+
+        self._values = tuple(values)
+        self._prefixes = tuple(x for x, _ in self._prefix)
+        self._suffixes = tuple(x for x, _ in self._suffix)
+
+        if len(self._regex) > 1:
+            try:
+                combined = "|".join(f"(?:{x.pattern})" for x, _ in self._regex)
+                self._combined = re.compile(combined)
+            except re.error:
+                self._combined = None
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # compiled patterns are stored as text, pickle would do the same
+        state = self.__dict__.copy()
+        state["_regex"] = [(getattr(x, "pattern", x), i) for x, i in self._regex]
+        state["_loose"] = [(x.pattern, i) for x, i in self._loose]
+        state["_combined"] = self._combined.pattern if self._combined is not None else None
+        state["_memo"] = dict()
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._loose = [(re.compile(x), i) for x, i in self._loose]
+        if self._combined is not None:
+            # single patterns are compiled when the combined one first hits
+            self._combined = re.compile(self._combined)
+            self._regex_ready = False
+        else:
+            self._compile_regex()
+
+    def _compile_regex(self) -> None:
+        # the list is replaced, not changed in place, so other threads see the old or the new one
+        self._regex = [(re.compile(x), i) for x, i in self._regex]
+        self._regex_ready = True
+
+    def _regex_hit(self, pattern: Any, path: str) -> bool:
+        if self._anchored:
+            return pattern.match(path) is not None
+        return pattern.search(path) is not None
+
+    def _remember(self, key: Any, value: Any) -> None:
+        memo = self._memo
+        if len(memo) >= _MEMO_SIZE:
+            # a new dict, not clear(): other threads may still write to the old one
+            memo = self._memo = dict()
+        memo[key] = value
+
+    def _predicate_hit(self, predicate: Callable[..., Any], index: int, view: Any) -> bool:
+        key = (index, view.shape)
+        hit = self._memo.get(key)
+        if hit is None:
+            hit, by_index = view.test(predicate)
+            self._remember(key, _BY_INDEX if by_index else hit)
+        elif hit is _BY_INDEX:
+            hit, _ = view.test(predicate)
+        return hit
+
+    @property
+    def structural(self) -> bool:
+        """True if some rules need the structured path, not only its text."""
+        return len(self.predicates) > 0 or self._templates is not None
+
+    def _template_hits(self, shape: Tuple[Any, ...]) -> List[int]:
+        key = ("template", shape)
+        hits = self._memo.get(key)
+        if hits is None:
+            hits = self._templates.find(shape)  # type: ignore
+            self._remember(key, hits)
+        return hits
+
+    def structural_hits(self, view: Any) -> List[int]:
+        """Rules among predicates and templates matching view, for hits= of a later lookup."""
+        found = list(self._template_hits(view.shape)) if self._templates is not None else []
+        found.extend(i for x, i in self.predicates if self._predicate_hit(x, i, view))
+        return found
+
+    def _indices(self, path: str, view: Any = None, hits: Iterable[int] = ()) -> List[int]:
+        found = list(self._exact.get(path, ()))
+        found.extend(hits)
+
+        if self._prefixes and path.startswith(self._prefixes):
+            found.extend(i for x, i in self._prefix if path.startswith(x))
+        if self._suffixes and path.endswith(self._suffixes):
+            found.extend(i for x, i in self._suffix if path.endswith(x))
+        for body, index in self._contains:
+            if body in path:
+                found.append(index)
+
+        if self._regex:
+            if self._combined is None or self._regex_hit(self._combined, path):
+                if not self._regex_ready:
+                    self._compile_regex()
+                found.extend(i for x, i in self._regex if self._regex_hit(x, path))
+        for pattern, index in self._loose:
+            if self._regex_hit(pattern, path):
+                found.append(index)
+        if view is not None:
+            found.extend(self.structural_hits(view))
+
+        return found
+
+    def matches(self, path: str, view: Any = None, hits: Iterable[int] = ()) -> bool:
+        return len(self._values) > 0 and len(self._indices(path, view, hits)) > 0
+
+    def values(self, path: str, view: Any = None, hits: Iterable[int] = ()) -> List[Any]:
+        """All values of rules matching path, in the order rules were given."""
+        return [self._values[i] for i in sorted(set(self._indices(path, view, hits)))]
+
+    def last(self, path: str, default: Any = _MISSING, view: Any = None, hits: Iterable[int] = ()) -> Any:
+        """Value of the last rule matching path, like overriding in a loop."""
+        found = self._indices(path, view, hits)
+        if not found:
+            return default
+        return self._values[max(found)]
+
+
+class _Rules:
+    """
+    Compiled rules of a dumper, shared by all its dumps and threads.
+    Read-only, everything a dump changes lives in its _Dumper instance.
+    """
+
+    __slots__ = ("style", "flow_style", "before", "after")
+
+    def __init__(
+        self,
+        style: Union[Dict[str, Any], None] = None,
+        before: Union[Dict[str, Any], None] = None,
+        after: Union[Dict[str, Any], None] = None,
+        flow_style: Union[Dict[str, Any], None] = None,
+    ):
+        # style rules are matched from the path start (re.match),
+        # comment rules anywhere in the path (re.search)
+        object.__setattr__(self, "style", _RuleTable(style, anchored=True))
+        object.__setattr__(self, "flow_style", _RuleTable(flow_style, anchored=True))
+        object.__setattr__(self, "before", _RuleTable(before, anchored=False))
+        object.__setattr__(self, "after", _RuleTable(after, anchored=False))
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is read-only, create a new dumper to change rules")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{type(self).__name__} is read-only, create a new dumper to change rules")
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return _restore_rules, (self.style, self.flow_style, self.before, self.after)
+
+
+def _restore_rules(*tables: _RuleTable) -> _Rules:
+    rules = _Rules.__new__(_Rules)
+    for name, table in zip(_Rules.__slots__, tables):
+        object.__setattr__(rules, name, table)
+    return rules
+
+
+def _rules_digest(*parts: Any) -> str:
+    import hashlib
+
+    # rule order matters, so the items are hashed as they are, not sorted
+    text = repr([list(x.items()) if isinstance(x, dict) else x for x in parts])
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=20).hexdigest()
+
+
+def _rule_keys(*tables: Union[Dict[Any, Any], None]) -> List[Any]:
+    return [x for table in tables if table for x in table]
+
+
+def _load_rules(
+    style: Union[Dict[str, Any], None],
+    before: Union[Dict[str, Any], None],
+    after: Union[Dict[str, Any], None],
+    flow_style: Union[Dict[str, Any], None],
+    delimiter: str,
+    cache_dir: Union[str, None] = None,
+) -> _Rules:
+    """
+    Compile rules, or load them from cache_dir where they were saved by an
+    earlier call with the same rules and delimiter.
+    """
+    if cache_dir is None or any(callable(x) for x in _rule_keys(style, before, after, flow_style)):
+        # predicates have no stable digest, they are compiled every time
+        return _Rules(style=style, before=before, after=after, flow_style=flow_style)
+
+    # deferred, most dumpers do not use the cache and should not pay for these imports
+    import os
+    import pickle
+    import tempfile
+
+    digest = _rules_digest(style, before, after, flow_style, delimiter)
+    path = os.path.join(cache_dir, f"{digest}.rules")
+    try:
+        with open(path, "rb") as file:
+            header, rules = pickle.load(file)
+        if header == (_CACHE_FORMAT, digest) and isinstance(rules, _Rules):
+            return rules
+    except Exception:
+        # missing, broken, or written by another version that refers to modules or names not here: built again below
+        pass
+
+    rules = _Rules(style=style, before=before, after=after, flow_style=flow_style)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    except OSError:
+        return rules  # the cache is only an optimization
+    try:
+        with os.fdopen(fd, "wb") as file:
+            pickle.dump(((_CACHE_FORMAT, digest), rules), file, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, path)  # readers never see a half written file
+    except (OSError, pickle.PicklingError):
+        if os.path.exists(temp):
+            os.unlink(temp)
+    return rules
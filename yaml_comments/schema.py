@@ -0,0 +1,159 @@
+import collections.abc
+import dataclasses
+import functools
+import json
+import re
+import types
+import typing
+from typing import Any, Dict, List, Tuple, Union
+
+from .hook_dumper import DOUBLE_QUOTE, INLINE, LITERAL
+from .rules import _ANY_KEY, _ITEM, _OtherKeys, _Template
+
+# strings that YAML 1.1 loaders would read back as timestamps unless quoted
+_QUOTED_FORMATS = {"date", "date-time", "time"}
+_SCALAR_TYPES = {"integer", "number", "boolean"}
+# keys of dataclass field metadata that are used like the same schema keywords
+_FIELD_KEYWORDS = ("description", "title", "format", "contentMediaType", "contentEncoding")
+# type of "X | None" annotations, python 3.10 and later
+_UNION_TYPE = getattr(types, "UnionType", None)
+
+
+class _Compiler:
+    def __init__(self, schema: Dict[str, Any]):
+        self._schema = schema
+        self._comments: Dict[_Template, List[str]] = dict()
+        self._style: Dict[_Template, str] = dict()
+        self._flow_style: Dict[_Template, bool] = dict()
+
+    def run(self) -> Dict[str, Dict[Any, Any]]:
+        self._walk(self._schema, (), ())
+        return {
+            "before": {k: "\n".join(v) for k, v in self._comments.items()},
+            "style": self._style,
+            "flow_style": self._flow_style,
+        }
+
+    def _resolve(self, ref: str) -> Any:
+        # local references only, "#/$defs/name" or "#/definitions/name"
+        if not ref.startswith("#"):
+            return None
+        target: Any = self._schema
+        for part in ref[1:].split("/")[1:]:
+            part = part.replace("~1", "/").replace("~0", "~")
+            if not isinstance(target, dict) or part not in target:
+                return None
+            target = target[part]
+        return target
+
+    def _walk(self, schema: Any, path: Tuple[Any, ...], refs: Tuple[str, ...]) -> None:
+        if not isinstance(schema, dict):
+            return
+
+        ref = schema.get("$ref")
+        if isinstance(ref, str) and ref not in refs:  # a recursive schema is described down to its first repetition
+            self._walk(self._resolve(ref), path, refs + (ref,))
+
+        if path:
+            self._describe(schema, _Template(path))
+
+        for key, value in (schema.get("properties") or {}).items():
+            self._walk(value, path + (key,), refs)
+        for pattern, value in (schema.get("patternProperties") or {}).items():
+            self._walk(value, path + (re.compile(pattern),), refs)
+        if isinstance(schema.get("additionalProperties"), dict):
+            # only for the keys that neither properties nor patternProperties of this schema describe
+            properties = schema.get("properties") or {}
+            patterns = [re.compile(x) for x in schema.get("patternProperties") or ()]
+            other = _OtherKeys(properties, patterns) if properties or patterns else _ANY_KEY
+            self._walk(schema["additionalProperties"], path + (other,), refs)
+        if isinstance(schema.get("items"), dict):
+            self._walk(schema["items"], path + (_ITEM,), refs)
+        for keyword in ("allOf", "anyOf", "oneOf"):
+            for value in schema.get(keyword) or ():
+                self._walk(value, path, refs)
+
+    def _describe(self, schema: Dict[str, Any], template: _Template) -> None:
+        text = schema.get("description", schema.get("title"))
+        if isinstance(text, str) and text.strip():
+            comment = "\n".join(("# " + x).rstrip() for x in text.strip().split("\n"))
+            comments = self._comments.setdefault(template, list())
+            if comment not in comments:
+                comments.append(comment)
+
+        kind = schema.get("type")
+        if kind == "string":
+            if "contentMediaType" in schema or "contentEncoding" in schema:
+                self._style.setdefault(template, LITERAL)  # embedded scripts, certificates, base64
+            elif schema.get("format") in _QUOTED_FORMATS:
+                self._style.setdefault(template, DOUBLE_QUOTE)
+        elif kind == "array":
+            items = schema.get("items")
+            if isinstance(items, dict) and items.get("type") in _SCALAR_TYPES:
+                self._flow_style.setdefault(template, INLINE)
+
+
+@functools.lru_cache(maxsize=64)
+def _compile(text: str) -> Dict[str, Dict[Any, Any]]:
+    return _Compiler(json.loads(text)).run()
+
+
+def _type_schema(kind: Any, defs: Dict[str, Any]) -> Dict[str, Any]:
+    if isinstance(kind, type) and dataclasses.is_dataclass(kind):
+        return _dataclass_ref(kind, defs)
+
+    origin = getattr(kind, "__origin__", None)
+    args = [x for x in getattr(kind, "__args__", None) or () if x is not Ellipsis]
+    if origin is Union or (_UNION_TYPE is not None and isinstance(kind, _UNION_TYPE)):
+        options = [_type_schema(x, defs) for x in args if x is not type(None)]
+        return options[0] if len(options) == 1 else {"anyOf": options}
+    if isinstance(origin, type) and issubclass(origin, collections.abc.Mapping):
+        return {"type": "object", "additionalProperties": _type_schema(args[1], defs) if len(args) > 1 else {}}
+    if isinstance(origin, type) and issubclass(origin, (list, tuple, set, frozenset, collections.abc.Sequence)):
+        return {"type": "array", "items": _type_schema(args[0], defs) if args else {}}
+
+    names = {str: "string", bool: "boolean", int: "integer", float: "number"}
+    return {"type": names[kind]} if kind in names else {}
+
+
+def _dataclass_ref(cls: type, defs: Dict[str, Any]) -> Dict[str, Any]:
+    # every dataclass is described once in $defs, its uses refer to it like in a JSON Schema
+    name = f"{cls.__module__}.{cls.__qualname__}".replace("~", "~0").replace("/", "~1")
+    if name not in defs:
+        defs[name] = None  # taken before the fields, a recursive use refers to it
+        hints = typing.get_type_hints(cls)
+        properties = dict()
+        for field in dataclasses.fields(cls):
+            schema = _type_schema(hints.get(field.name, Any), defs)
+            schema.update({k: v for k, v in field.metadata.items() if k in _FIELD_KEYWORDS})
+            properties[field.name] = schema
+        defs[name] = {"type": "object", "properties": properties}
+    return {"$ref": f"#/$defs/{name}"}
+
+
+def _dataclass_schema(cls: type) -> Dict[str, Any]:
+    defs: Dict[str, Any] = dict()
+    return {**_dataclass_ref(cls, defs), "$defs": defs}
+
+
+def schema_rules(schema: Union[Dict[str, Any], type]) -> Dict[str, Dict[Any, Any]]:
+    """
+    Rules for create_dumper(**schema_rules(schema)) from a JSON Schema (a
+    dict) or a dataclass whose fields have a "description" in their metadata:
+
+    before      descriptions (or titles) of properties as comments
+    style       literal for strings with contentMediaType or contentEncoding,
+                double quotes for date and time formats
+    flow_style  inline for arrays of numbers or booleans
+
+    Rules are path templates: "items" stands for every item of a sequence,
+    "additionalProperties" for every other key. They are looked up in a
+    trie by the structure of the path, not by regex, once per path shape.
+    Local $ref, allOf, anyOf and oneOf are followed, tuple-form items are
+    not. Compiled rules of the same schema are cached.
+    """
+    if isinstance(schema, type) and dataclasses.is_dataclass(schema):
+        schema = _dataclass_schema(schema)
+    compiled = _compile(json.dumps(schema, default=str))
+    # copies, the caller may add its own rules to them
+    return {name: dict(rules) for name, rules in compiled.items()}
@@ -0,0 +1,116 @@
+import functools
+import multiprocessing
+import os
+import pickle
+import re
+from typing import Any, Dict, List, Sequence, Tuple, Type, Union
+
+from .hook_dumper import _Dumper, create_dumper
+from .writer import FileWriter
+
+
+_UNSAFE = re.compile(r"[^\w.-]+")
+
+
+def _shard_names(keys: List[Any], index: Union[str, None]) -> List[str]:
+    taken = {index} if index is not None else set()
+    names = list()
+    for key in keys:
+        base = _UNSAFE.sub("_", str(key)).strip("._") or "shard"
+        name, n = f"{base}.yaml", 1
+        while name in taken:
+            n += 1
+            name = f"{base}-{n}.yaml"
+        taken.add(name)
+        names.append(name)
+    return names
+
+
+def _write_shard(task: Tuple[Type[_Dumper], Dict[str, Any], List[Any], Any, str]) -> bool:
+    Dumper, kwds, root, data, path = task
+    return FileWriter(functools.partial(Dumper, root=root), **kwds).dump(data, path)
+
+
+def _picklable(obj: Any) -> bool:
+    try:
+        pickle.dumps(obj)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return False
+    return True
+
+
+def _replace(data: Any, split: List[Any], value: Any) -> Any:
+    # copy of data with value at split, the rest is shared
+    if not split:
+        return value
+    head, *rest = split
+    if isinstance(data, dict):
+        return {**data, head: _replace(data[head], rest, value)}
+    copy = list(data)
+    copy[head] = _replace(data[head], rest, value)
+    return type(data)(copy)
+
+
+def dump_sharded(
+    data: Any,
+    split: Sequence[Any],
+    directory: str,
+    Dumper: Union[Type[_Dumper], None] = None,
+    index: Union[str, None] = "index.yaml",
+    jobs: int = 1,
+    **kwds,
+) -> Dict[Any, str]:
+    """
+    Write each entry of the mapping or sequence at split (a list of keys
+    and indexes, [] for the top level) to its own file in directory and
+    return the file name of every key.
+
+    Rules match the shards by their full paths, as if they were still in
+    data, so comments inside a shard are the same as in one big dump.
+    Comments of the entries themselves and of everything outside split
+    go to the index, the document with every entry replaced by the name
+    of its file, unless index is None. Shards are rendered by jobs worker
+    processes, 0 for one per CPU. Files that did not change are not written.
+
+    Workers get a copy of Dumper, a RenderCache in it starts empty in each
+    of them. A Dumper that cannot be pickled, like one with predicate rules
+    that are lambdas or local functions, renders all shards in this process.
+    """
+    Dumper = Dumper or create_dumper()
+    split = list(split)
+    container = data
+    for key in split:
+        try:
+            container = container[key]
+        except (KeyError, IndexError, TypeError):
+            raise ValueError(f"split path {split!r} is not in the data") from None
+    if isinstance(container, dict):
+        keys = list(container)
+    elif isinstance(container, (list, tuple)):
+        keys = list(range(len(container)))
+    else:
+        raise ValueError(f"split path {split!r} is not a mapping or a sequence")
+
+    os.makedirs(directory, exist_ok=True)
+    names = _shard_names(keys, index)
+    tasks = [
+        (Dumper, kwds, [*split, key], container[key], os.path.join(directory, name))
+        for key, name in zip(keys, names)
+    ]
+
+    jobs = jobs if jobs > 0 else os.cpu_count() or 1
+    jobs = min(jobs, max(len(tasks), 1))
+    if jobs > 1 and not _picklable((Dumper, kwds)):
+        jobs = 1
+    if jobs == 1:
+        list(map(_write_shard, tasks))
+    else:
+        chunksize = max(1, len(tasks) // (jobs * 4))
+        with multiprocessing.Pool(jobs) as pool:
+            list(pool.imap_unordered(_write_shard, tasks, chunksize))
+
+    files = dict(zip(keys, names))
+    if index is not None:
+        listing = files if isinstance(container, dict) else names
+        FileWriter(Dumper, **kwds).dump(_replace(data, split, listing), os.path.join(directory, index))
+    return files
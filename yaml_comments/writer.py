@@ -0,0 +1,115 @@
+import hashlib
+import mmap
+import os
+import stat
+from typing import Any, Type, Union
+
+from .hook_dumper import _Dumper, create_dumper, dumps_bytes
+
+
+class FileWriter:
+    """
+    Dumps documents to files, leaving files that already hold the same
+    bytes untouched (no write, no mtime change). Changed files are replaced
+    atomically.
+
+    The new output is compared with a memory-mapped copy of the old file
+    chunk by chunk, or with sidecar=True with a hash kept in "<path>.hash",
+    so that unchanged files do not have to be read at all.
+    """
+
+    def __init__(
+        self,
+        Dumper: Union[Type[_Dumper], None] = None,
+        sidecar: bool = False,
+        chunk_size: int = 1 << 20,
+        **kwds,
+    ):
+        self.written = 0
+        self.skipped = 0
+        self._dumper = Dumper or create_dumper()
+        self._sidecar = sidecar
+        self._chunk_size = chunk_size
+        self._kwds = kwds
+
+    def dump(self, data: Any, path: str) -> bool:
+        """Dump data to path, returns False if the file was already up to date."""
+        content = dumps_bytes(data, self._dumper, **self._kwds)
+
+        known = False
+        if self._sidecar:
+            digest = hashlib.blake2b(content, digest_size=20).hexdigest()
+            known = _read_text(path + ".hash") == digest
+        if known and _size(path) == len(content):
+            changed = False
+        else:
+            changed = not self._same_content(path, content)
+
+        if changed:
+            _write_atomic(path, content)
+            self.written += 1
+        else:
+            self.skipped += 1
+        if self._sidecar and not known:
+            # only once the content is in place, a hash of content that was not written would skip it next time
+            _write_atomic(path + ".hash", digest.encode())
+        return changed
+
+    def _same_content(self, path: str, content: bytearray) -> bool:
+        try:
+            file = open(path, "rb")
+        except FileNotFoundError:
+            return False
+        with file:
+            size = os.fstat(file.fileno()).st_size
+            if size != len(content):
+                return False
+            if size == 0:
+                return True
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as old, memoryview(content) as new:
+                    for start in range(0, size, self._chunk_size):
+                        end = start + self._chunk_size
+                        if old[start:end] != new[start:end]:
+                            return False
+        return True
+
+
+def _size(path: str) -> int:
+    try:
+        return os.stat(path).st_size
+    except FileNotFoundError:
+        return -1
+
+
+def _read_text(path: str) -> Union[str, None]:
+    try:
+        with open(path) as file:
+            return file.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _write_atomic(path: str, content: Union[bytes, bytearray]) -> None:
+    # a temporary file next to the target, renamed over it when complete
+    directory, name = os.path.split(os.path.abspath(path))
+    temp = os.path.join(directory, f".{name}.{os.urandom(4).hex()}.tmp")
+    try:
+        mode: Union[int, None] = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = None
+
+    # new files get 0o666 reduced by umask, like open() would create them
+    fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        if mode is not None:
+            os.chmod(temp, mode)
+        os.replace(temp, path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.unlink(temp)
+        raise